@@ -4,15 +4,24 @@ VIRTUALENV_BIN=/home/ubuntu/virtual_env/mnemonic/bin
 cd /home/ubuntu/Mnemonic
 source $VIRTUALENV_BIN/activate && source $VIRTUALENV_BIN/postactivate
 
+# crawl: feed crawls and single article tasks
+# fetch: downloads article html - I/O bound, so lots of greenlets
+# extract: parses cached html into bodies - CPU bound, so one process per core
 echo "${1-start}ing celery news"
 DJANGO_SETTINGS_MODULE=mnemonic.core.settings $VIRTUALENV_BIN/celery multi ${1} \
-    1 \
+    crawl fetch extract \
 	-A mnemonic.core \
     --pidfile=pids/celery/%N.pid \
-    --hostname=celery_%i@%h \
+    --hostname=celery_%N@%h \
 	-l INFO \
 	--logfile=logs/celery/%N.log \
     --without-gossip --without-mingle --without-heartbeat \
-    --pool=solo \
-    -Q:1 T_crawl_feed,T_process_article \
-    -c:1 1
+    -Q:crawl T_crawl_feed,T_process_article \
+    -P:crawl solo \
+    -c:crawl 1 \
+    -Q:fetch T_fetch_article \
+    -P:fetch gevent \
+    -c:fetch 100 \
+    -Q:extract T_extract_article \
+    -P:extract prefork \
+    -c:extract `nproc`
@@ -0,0 +1,6 @@
+#!/usr/bin/env bash
+VIRTUALENV_BIN=/home/ubuntu/virtual_env/mnemonic/bin
+cd /home/ubuntu/Mnemonic
+source $VIRTUALENV_BIN/activate && source $VIRTUALENV_BIN/postactivate
+
+DJANGO_SETTINGS_MODULE=mnemonic.core.settings $VIRTUALENV_BIN/python manage.py run_indexer >> logs/indexer.log 2>&1
@@ -32,9 +32,11 @@ class ArticleItemPipeline(object):
                                        **item)
         except IntegrityError as ex:
             if 'duplicate key value violates unique constraint' in ex.args[0]:
+                spider.seen_urls.add(url)
                 raise DropItem('Article with url:[%s] exists' % url)
             else:
                 raise ex
         else:
             _LOG.info('Article created with url:[%s]', url)
+            spider.seen_urls.add(a.url)
             a.process_async()
@@ -9,6 +9,7 @@ from django.db.models import Q
 
 from mnemonic.contrib.article_archive_scrapers.base.items import ArticleItemPipeline, ArticleItem
 from mnemonic.news.models import Feed, NewsSource, Article
+from mnemonic.news.utils.cache_utils import SeenURLIndex
 # from mnemonic.news.utils.cache_utils import DownloadCacheStorage
 from mnemonic.news.utils.class_utils import get_python_path
 from mnemonic.news.utils.string_utils import slugify
@@ -22,6 +23,10 @@ class BaseArchiveSpider(scrapy.Spider):
     news_source_name = None
     article_domain = None
 
+    def __init__(self, *args, **kwargs):
+        super(BaseArchiveSpider, self).__init__(*args, **kwargs)
+        self.seen_urls = SeenURLIndex(use_bloom_filter=settings.SEEN_URL_INDEX_USE_BLOOM_FILTER)
+
     @staticmethod
     def get_settings():
         d = get_project_settings()
@@ -88,7 +93,10 @@ class BaseArchiveSpider(scrapy.Spider):
 
         if not self.is_url_valid(url_parts):
             self.log('Article with url:[%s] does not match domain:[%s]' % (url, self.article_domain))
+        elif url_parts.geturl() in self.seen_urls:
+            self.log('Article with url:[%s] exists' % url)
         elif Article.objects.filter(url_checks).exists():
+            self.seen_urls.add(url_parts.geturl())
             self.log('Article with url:[%s] exists' % url)
         else:
             if callback is None:
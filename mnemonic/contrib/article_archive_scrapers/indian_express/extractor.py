@@ -0,0 +1,9 @@
+from mnemonic.news.utils.extractor_utils import XPathExtractor
+
+
+class IndianExpressExtractor(XPathExtractor):
+    name = 'indian_express'
+    domains = ['indianexpress.com', 'www.indianexpress.com', 'archive.indianexpress.com']
+    body_xpath = '//div[@itemprop="articleBody"]/p | ' \
+                 '//div[contains(concat(" ", @class, " "), " full-details ")]/p | ' \
+                 '//div[contains(concat(" ", @class, " "), " ie2013-contentstory ")]/p'
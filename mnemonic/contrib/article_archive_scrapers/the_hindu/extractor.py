@@ -0,0 +1,8 @@
+from mnemonic.news.utils.extractor_utils import XPathExtractor
+
+
+class TheHinduExtractor(XPathExtractor):
+    name = 'the_hindu'
+    domains = ['www.thehindu.com', 'thehindu.com']
+    body_xpath = '//div[starts-with(@id, "content-body-")]/p | ' \
+                 '//div[contains(concat(" ", @class, " "), " articlebodycontent ")]/p'
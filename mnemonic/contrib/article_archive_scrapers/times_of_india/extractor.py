@@ -0,0 +1,11 @@
+from mnemonic.news.utils.extractor_utils import XPathExtractor
+
+
+class TimesOfIndiaExtractor(XPathExtractor):
+    name = 'times_of_india'
+    domains = ['timesofindia.indiatimes.com']
+    # current article pages keep the body in a single div with <br>s between
+    # paragraphs, older (archive) pages use div.Normal
+    body_xpath = '//div[contains(concat(" ", @class, " "), " _s30J ")] | ' \
+                 '//div[contains(concat(" ", @class, " "), " ga-headlines ")] | ' \
+                 '//div[contains(concat(" ", @class, " "), " Normal ")]'
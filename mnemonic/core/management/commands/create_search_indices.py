@@ -12,5 +12,8 @@ class Command(BaseCommand):
     def handle(self, **options):
         autodiscover_modules('search_indices')
         for search_class in Document.__subclasses__():
-            search_class.init()
+            if hasattr(search_class, 'init_template'):
+                search_class.init_template()
+            else:
+                search_class.init()
             _LOG.info('search_class:[%s] initialized', search_class)
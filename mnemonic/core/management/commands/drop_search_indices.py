@@ -11,4 +11,9 @@ _LOG = logging.getLogger(__name__)
 class Command(BaseCommand):
     def handle(self, **options):
         es = Elasticsearch(settings.ELASTICSEARCH_HOSTS)
-        es.indices.delete(index='_all')
+        # only the news indices - not everything else that lives in the cluster
+        es.indices.delete(index=settings.NEWS_INDEX_PREFIX + '*')
+        es.indices.delete_template(name=settings.NEWS_INDEX_PREFIX + '*', ignore=404)
+
+        from mnemonic.news.utils.cache_utils import DiskCacheManager
+        DiskCacheManager.clear_index_caches()
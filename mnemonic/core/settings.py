@@ -212,6 +212,12 @@ CELERY_TASK_ROUTING_KEY_CRAWL_FEED = 'mnemonic.T_crawl_feed'
 CELERY_TASK_QUEUE_PROCESS_ARTICLE = 'T_process_article'
 CELERY_TASK_ROUTING_KEY_PROCESS_ARTICLE = 'mnemonic.T_process_article'
 
+CELERY_TASK_QUEUE_FETCH_ARTICLE = 'T_fetch_article'
+CELERY_TASK_ROUTING_KEY_FETCH_ARTICLE = 'mnemonic.T_fetch_article'
+
+CELERY_TASK_QUEUE_EXTRACT_ARTICLE = 'T_extract_article'
+CELERY_TASK_ROUTING_KEY_EXTRACT_ARTICLE = 'mnemonic.T_extract_article'
+
 CELERY_TASK_QUEUE_CRAWL_TWITTER = 'T_crawl_twitter'
 CELERY_TASK_ROUTING_KEY_CRAWL_TWITTER = 'mnemonic.T_crawl_twitter'
 
@@ -225,6 +231,12 @@ CELERY_TASK_QUEUES = (
     Queue(CELERY_TASK_QUEUE_PROCESS_ARTICLE,
           Exchange(CELERY_TASK_QUEUE_PROCESS_ARTICLE),
           routing_key=CELERY_TASK_ROUTING_KEY_PROCESS_ARTICLE),
+    Queue(CELERY_TASK_QUEUE_FETCH_ARTICLE,
+          Exchange(CELERY_TASK_QUEUE_FETCH_ARTICLE),
+          routing_key=CELERY_TASK_ROUTING_KEY_FETCH_ARTICLE),
+    Queue(CELERY_TASK_QUEUE_EXTRACT_ARTICLE,
+          Exchange(CELERY_TASK_QUEUE_EXTRACT_ARTICLE),
+          routing_key=CELERY_TASK_ROUTING_KEY_EXTRACT_ARTICLE),
     Queue(CELERY_TASK_QUEUE_CRAWL_TWITTER,
           Exchange(CELERY_TASK_QUEUE_CRAWL_TWITTER),
           routing_key=CELERY_TASK_ROUTING_KEY_CRAWL_TWITTER),
@@ -9,6 +9,9 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--since-hours', default=None, type=int,
                             help="How many hours of tweets to crawl")
+        parser.add_argument('--incremental', action='store_true',
+                            help="Only crawl tweets newer than the newest tweet seen by earlier crawls of each handle. "
+                                 "Handles that haven't been crawled yet start from --since-hours")
 
     def handle(self, *args, **options):
         if options['since_hours']:
@@ -16,4 +19,4 @@ class Command(BaseCommand):
         else:
             since = None
         for person in Person.objects.all():
-            person.crawl_tweets_async(since=since)
+            person.crawl_tweets_async(since=since, incremental=options['incremental'])
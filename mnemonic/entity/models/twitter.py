@@ -1,8 +1,10 @@
+from datetime import date, datetime, timedelta
 import logging
 
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.utils import timezone
 
 from mnemonic.entity.models.base import EntityBase
 
@@ -15,11 +17,37 @@ class TwitterMixin(EntityBase):
     class Meta:
         abstract = True
 
-    def _crawl_tweets(self, since=None, until=None, mentions=False, only_cached=False):
-        from mnemonic.news.models import TwitterJob
-        TwitterJob.create(self, since=since, until=until, mentions=mentions, only_cached=only_cached)
+    def _crawl_tweets(self, since=None, until=None, mentions=False, only_cached=False, incremental=False):
+        from mnemonic.news.models import TwitterCrawlState, TwitterJob
 
-    def crawl_tweets(self, since=None, until=None, mentions=None, only_cached=False):
+        if only_cached:
+            TwitterJob.create(self, since=since, until=until, mentions=mentions, only_cached=only_cached)
+            return
+
+        state = TwitterCrawlState.get_for(self.twitter_handle, mentions)
+        if incremental and state.get_incremental_since() is not None:
+            since = state.get_incremental_since()
+        if isinstance(since, datetime):
+            since = since.date()
+        if isinstance(until, datetime):
+            until = until.date()
+
+        # only the parts of the window that no earlier job has crawled completely
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        start = since or date.fromisoformat(settings.TWITTER_CRAWL_START_DATE)
+        gaps = state.get_gaps(start, until or tomorrow)
+        if not gaps:
+            _LOG.info('%s - [%s, %s) has already been crawled', state, start, until)
+        for gap_since, gap_until in gaps:
+            TwitterJob.create(self, since=gap_since, until=gap_until if gap_until < tomorrow else until,
+                              mentions=mentions, only_cached=only_cached)
+
+    def crawl_tweets(self, since=None, until=None, mentions=None, only_cached=False, incremental=False):
+        """
+        crawls [since, until) minus what earlier crawls have already covered.
+        incremental crawls start from the newest tweet seen so far, less
+        TWITTER_CRAWL_OVERLAP_HOURS, instead of since
+        """
         if self.twitter_handle is None:
             _LOG.warning('%s does not have a twitter handle', self)
             return
@@ -27,14 +55,16 @@ class TwitterMixin(EntityBase):
         if mentions is None:
             mentions = [False, True]
         for mentions in mentions:
-            self._crawl_tweets(since=since, until=until, mentions=mentions, only_cached=only_cached)
+            self._crawl_tweets(since=since, until=until, mentions=mentions, only_cached=only_cached,
+                               incremental=incremental)
 
-    def crawl_tweets_async(self, since=None, until=None, mentions=None):
+    def crawl_tweets_async(self, since=None, until=None, mentions=None, incremental=False):
         from mnemonic.entity.tasks import crawl_tweets_async
         crawl_tweets_async.apply_async(kwargs={'entity_ct': ContentType.objects.get_for_model(self).pk,
                                                'entity_id': self.pk,
                                                'since': since,
                                                'until': until,
-                                               'mentions': mentions},
+                                               'mentions': mentions,
+                                               'incremental': incremental},
                                        queue=settings.CELERY_TASK_QUEUE_CRAWL_TWITTER,
                                        routing_key=settings.CELERY_TASK_ROUTING_KEY_CRAWL_TWITTER)
@@ -4,7 +4,7 @@ from mnemonic.core.celery import app as celery_app
 
 
 @celery_app.task(ignore_result=True)
-def crawl_tweets_async(entity_ct, entity_id, since, until, mentions):
+def crawl_tweets_async(entity_ct, entity_id, since, until, mentions, incremental=False):
     klass = ContentType.objects.get_for_id(entity_ct).model_class()
     entity = klass.objects.get(pk=entity_id)
-    entity.crawl_tweets(since=since, until=until, mentions=mentions)
+    entity.crawl_tweets(since=since, until=until, mentions=mentions, incremental=incremental)
@@ -3,7 +3,7 @@ from django.contrib import admin, messages
 from django.contrib.contenttypes.models import ContentType
 
 from mnemonic.core.admin import BaseAdmin
-from mnemonic.news.models import Article, Feed, NewsSource, TwitterJob
+from mnemonic.news.models import Article, Feed, IndexingError, NewsSource, TwitterCrawlState, TwitterJob
 
 
 @admin.register(Article)
@@ -12,6 +12,19 @@ class ArticleAdmin(BaseAdmin):
     list_filter = ['feed__source', 'is_top_news', 'is_pushed_to_index']
 
 
+@admin.register(IndexingError)
+class IndexingErrorAdmin(BaseAdmin):
+    list_display = ['content_type', 'object_id', 'status', 'created_on']
+    list_filter = ['content_type', 'status']
+
+
+@admin.register(TwitterCrawlState)
+class TwitterCrawlStateAdmin(BaseAdmin):
+    list_display = ['handle', 'mentions', 'max_tweet_id', 'max_datetime', 'updated_on']
+    list_filter = ['mentions']
+    search_fields = ['handle']
+
+
 @admin.register(NewsSource)
 class NewsSourceAdmin(BaseAdmin):
     list_display = ['name']
@@ -19,7 +32,7 @@ class NewsSourceAdmin(BaseAdmin):
 
 @admin.register(Feed)
 class FeedAdmin(BaseAdmin):
-    list_display = ['name', 'source', 'is_top_news']
+    list_display = ['name', 'source', 'is_top_news', 'last_crawled_on', 'next_crawl_on', 'crawl_error_count']
     list_filter = ['source', 'is_top_news']
     actions = ['crawl_feed']
 
@@ -1,13 +1,119 @@
 ARTICLE_CACHE_DIR = 'data/cache/articles/'
+ARTICLE_CACHE_BACKEND = 'mnemonic.news.utils.cache_backends.ShardedCacheBackend'
+ARTICLE_CACHE_SHARDED_DIR = 'data/cache/articles_sharded/'
+ARTICLE_CACHE_INDEX = 'article_cache_index'
+# settings for PackedSegmentCacheBackend
+ARTICLE_CACHE_SEGMENT_DIR = 'data/cache/articles_packed/'
+ARTICLE_CACHE_SEGMENT_INDEX = 'article_segment_index'
+ARTICLE_CACHE_SEGMENT_SIZE = 1024 * 1024 * 1024
+# 'zstd' or 'gzip'
+ARTICLE_CACHE_CODEC = 'zstd'
+ARTICLE_CACHE_COMPRESSION_LEVEL = 6
+ARTICLE_CACHE_ZSTD_DICT_DIR = 'data/cache/zstd_dicts/'
+# defaults to the most recently trained dictionary
+ARTICLE_CACHE_ZSTD_DICT_ID = None
+# serve entries from ARTICLE_CACHE_DIR until migrate_article_cache has moved them
+ARTICLE_CACHE_LEGACY_FALLBACK = True
 ARTICLE_ARCHIVE_CACHE_DIR = 'data/cache/article_archive/'
 FEED_SOURCE_GOOGLE_SHEET_ID = None
 SHOULD_LIMIT_ARCHIVE_CRAWL = False
 
+FEED_CRAWL_CONCURRENCY = 50
+FEED_CRAWL_CONCURRENCY_PER_HOST = 4
+FEED_CRAWL_TIMEOUT = 60
+FEED_PARSE_WORKERS = None
+
+# polling intervals are in minutes
+FEED_CRAWL_MIN_INTERVAL = 5
+FEED_CRAWL_MAX_INTERVAL = 24 * 60
+FEED_CRAWL_DEAD_INTERVAL = 3 * 24 * 60
+FEED_CRAWL_LEASE = 30
+FEED_CRAWL_JITTER = 0.1
+FEED_CRAWL_HISTORY_DAYS = 14
+FEED_CRAWL_DEAD_AFTER_DAYS = 30
+
+ARTICLE_PROCESS_BATCH_SIZE = 50
+# celery's prefork workers can't start child processes, keep this at 1 unless the worker runs with --pool=solo
+ARTICLE_EXTRACT_WORKERS = 1
+ARTICLE_EXTRACTORS = [
+    'mnemonic.contrib.article_archive_scrapers.times_of_india.extractor.TimesOfIndiaExtractor',
+    'mnemonic.contrib.article_archive_scrapers.the_hindu.extractor.TheHinduExtractor',
+    'mnemonic.contrib.article_archive_scrapers.indian_express.extractor.IndianExpressExtractor',
+]
+ARTICLE_FALLBACK_EXTRACTOR = 'mnemonic.news.utils.extractor_utils.NewspaperExtractor'
+# site extractor output shorter than this is discarded in favour of the fallback
+ARTICLE_EXTRACTOR_MIN_BODY_LENGTH = 200
+# bump when a change to extraction should invalidate cached extraction results
+ARTICLE_EXTRACTOR_VERSION = 2
+ARTICLE_EXTRACTION_CACHE_ENABLED = True
+ARTICLE_EXTRACTION_CACHE = 'article_extractions'
+ARTICLE_EXTRACTION_CACHE_MAX_SIZE = 2 * 1024 * 1024 * 1024
+ARTICLE_REEXTRACT_CHECKPOINT = 'state/reextract_articles.json'
+
+DOWNLOADER_TIMEOUT = 30
+DOWNLOADER_RETRIES = 3
+DOWNLOADER_BACKOFF = 0.5
+# number of domains to keep connections open to
+DOWNLOADER_POOL_SIZE = 100
+DOWNLOADER_CONCURRENCY_PER_DOMAIN = 4
+# threads (greenlets under gevent) per get_many() call
+DOWNLOADER_MAX_WORKERS = 32
+# requests per second per domain, with bursts of up to DOWNLOADER_BURST requests
+DOWNLOADER_RATE_LIMIT = 5
+DOWNLOADER_BURST = 10
+DOWNLOADER_DOMAIN_RATE_LIMITS = {}
+DOWNLOADER_USER_AGENT = None
+DOWNLOADER_METRICS_LOG_INTERVAL = 1000
+
+# documents are written to <prefix>-v<version>-YYYY-MM (or -YYYY) indices
+NEWS_INDEX_PREFIX = 'news'
+NEWS_INDEX_VERSION = 1
+# 'month' or 'year'
+NEWS_INDEX_PARTITION = 'month'
+NEWS_INDEX_READ_ALIAS = 'news'
+NEWS_INDEX_MAX_SEARCH_PARTITIONS = 60
+# how long a process trusts its lookup of the version the read alias points at
+NEWS_INDEX_ALIAS_CACHE_SECONDS = 60
+INDEX_BULK_THREAD_COUNT = 4
+INDEX_BULK_CHUNK_SIZE = 1000
+INDEX_BULK_MAX_CHUNK_BYTES = 10 * 1024 * 1024
+INDEX_BULK_REQUEST_TIMEOUT = 60
+# applied to the indices being loaded by bulk_load_mode()
+INDEX_BULK_LOAD_SETTINGS = {
+    'index.refresh_interval': '-1',
+    'index.number_of_replicas': 0,
+}
+# where overlapping bulk loads keep track of each other
+INDEX_BULK_LOAD_STATE_DIR = 'state/bulk_load/'
+INDEX_OUTBOX_BATCH_SIZE = 500
+INDEX_OUTBOX_CHANNEL = 'news_index_outbox'
+# seconds to wait for a notification before checking the outbox anyway
+INDEX_OUTBOX_POLL_INTERVAL = 30
+
+# tweet crawl results are stored as blocks of independently compressed frames. 'zstd' or 'raw'
+CRAWL_RESULTS_CODEC = 'zstd'
+CRAWL_RESULTS_COMPRESSION_LEVEL = 3
+# incremental crawls re-fetch this many hours before the newest tweet already seen
+TWITTER_CRAWL_OVERLAP_HOURS = 6
+# where crawls without a since date start from
+TWITTER_CRAWL_START_DATE = '2006-03-21'
+
 DISK_CACHE_ROOT = 'state/disk_cache/'
+DISK_CACHE_BLOOM_FILTER_CAPACITY = 10 * 1000 * 1000
+DISK_CACHE_BLOOM_FILTER_ERROR_RATE = 0.001
+DISK_CACHE_SEEN_URLS = 'seen_urls'
 DISK_CACHE_SEEN_TWEETS = 'seen_tweets'
+SEEN_URL_INDEX_USE_BLOOM_FILTER = True
+# there are far more tweets than DISK_CACHE_BLOOM_FILTER_CAPACITY
+SEEN_TWEET_INDEX_USE_BLOOM_FILTER = False
 DISK_CACHES = {
-    # DISK_CACHE_SEEN_TWEETS: {
-    #     'fn': 'mnemonic.news.utils.twitter_utils.update_seen_tweets_disk_cache',
-    #     'type': 'set'
-    # }
+    DISK_CACHE_SEEN_URLS: {
+        'fn': 'mnemonic.news.utils.cache_utils.update_seen_urls_disk_cache',
+        'type': 'set'
+    },
+    DISK_CACHE_SEEN_TWEETS: {
+        'fn': 'mnemonic.news.utils.twitter_utils.update_seen_tweets_disk_cache',
+        'type': 'set',
+        'per_index_version': True
+    }
 }
@@ -0,0 +1,71 @@
+from collections import defaultdict
+import difflib
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from mnemonic.news.models import Article
+from mnemonic.news.utils.cache_utils import DownloadCache
+from mnemonic.news.utils.extractor_utils import get_extractors, get_fallback_extractor
+
+_LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--domain', action='append',
+                            help="Domain to benchmark. Can be repeated. Defaults to every domain with an extractor")
+        parser.add_argument('--samples', default=100, type=int,
+                            help="Number of cached pages to sample per domain")
+
+    @staticmethod
+    def _timed(extractor, url, html):
+        start = time.time()
+        try:
+            result = extractor.extract(url, html)
+        except Exception as ex:
+            _LOG.debug('extractor:[%s] failed on url:[%s] - %s', extractor.name, url, ex)
+            result = None
+        return result, time.time() - start
+
+    def handle(self, *args, **options):
+        extractors = get_extractors()
+        fallback = get_fallback_extractor()
+        domains = options['domain'] or sorted(extractors.keys())
+        for domain in domains:
+            extractor = extractors.get(domain)
+            if extractor is None:
+                _LOG.warning('no extractor registered for domain:[%s]', domain)
+                continue
+
+            stats = defaultdict(float)
+            qs = Article.objects.filter(url__contains='://%s/' % domain).order_by('-pk')
+            for url in qs.values_list('url', flat=True).iterator():
+                if stats['num_pages'] >= options['samples']:
+                    break
+                html = DownloadCache(url).get(cache_only=True)
+                if html is None:
+                    continue
+
+                result, elapsed = self._timed(extractor, url, html)
+                fallback_result, fallback_elapsed = self._timed(fallback, url, html)
+                stats['num_pages'] += 1
+                stats['time'] += elapsed
+                stats['fallback_time'] += fallback_elapsed
+                if not extractor.is_valid(result):
+                    stats['num_invalid'] += 1
+                elif fallback_result is not None:
+                    stats['num_compared'] += 1
+                    stats['similarity'] += difflib.SequenceMatcher(None, result['text'].split(),
+                                                                   fallback_result['text'].split()).ratio()
+
+            if not stats['num_pages']:
+                _LOG.info('domain:[%s] - no cached pages found', domain)
+                continue
+            _LOG.info('domain:[%s] extractor:[%s] pages:%d invalid:%d - avg time:%.1fms vs %.1fms for %s (%.1fx),'
+                      ' avg similarity:%.2f',
+                      domain, extractor.name, stats['num_pages'], stats['num_invalid'],
+                      stats['time'] * 1000 / stats['num_pages'], stats['fallback_time'] * 1000 / stats['num_pages'],
+                      fallback.name, stats['fallback_time'] / (stats['time'] or 1e-9),
+                      stats['similarity'] / stats['num_compared'] if stats['num_compared'] else 0)
@@ -0,0 +1,97 @@
+import gzip
+import itertools
+import logging
+from multiprocessing import Pool
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from mnemonic.news.utils.block_utils import BlockReader
+from mnemonic.news.utils.frame_utils import FrameReader, FrameWriter
+from mnemonic.news.utils.iter_utils import chunkify
+from mnemonic.news.utils.msgpack_utils import dumps, streaming_loads
+from mnemonic.news.utils.twitter_utils import get_legacy_dicts
+
+_LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('fname', type=str,
+                            help="Crawl results file (.blocks or the old .msgpack/.msgpack.gz) to take tweets from")
+        parser.add_argument('--limit', default=200 * 1000, type=int,
+                            help="Number of tweets to benchmark with")
+        parser.add_argument('--frame-size', default=25 * 1000, type=int,
+                            help="Number of tweets per flush / frame")
+        parser.add_argument('--level', default=3, type=int,
+                            help="zstd compression level")
+        parser.add_argument('--workers', default=os.cpu_count(), type=int,
+                            help="Number of processes used to decode frames in parallel")
+
+    @staticmethod
+    def load(fname, limit):
+        if fname.endswith('.blocks'):
+            records = BlockReader(fname).iter_records()
+        else:
+            records = get_legacy_dicts(fname)
+        return list(itertools.islice(records, limit))
+
+    @staticmethod
+    def write_msgpack(fname, chunks, opener=open):
+        with opener(fname, 'wb') as f:
+            for chunk in chunks:
+                f.write(dumps(chunk))
+
+    @staticmethod
+    def write_frames(fname, chunks, codec, level):
+        with open(fname, 'wb') as f:
+            writer = FrameWriter(f, codec=codec, level=level)
+            for chunk in chunks:
+                writer.write(chunk)
+
+    @staticmethod
+    def count_msgpack(fname, opener=open):
+        with opener(fname, 'rb') as f:
+            return sum(len(d_set) for d_set in streaming_loads(f))
+
+    @staticmethod
+    def count_frames(fname, pool=None):
+        with open(fname, 'rb') as f:
+            return sum(1 for _ in FrameReader(f).iter_records(pool=pool))
+
+    def handle(self, *args, **options):
+        records = self.load(options['fname'], options['limit'])
+        chunks = [list(chunk) for chunk in chunkify(records, options['frame_size'])]
+        _LOG.info('benchmarking with %s tweet(s) in %s chunk(s)', len(records), len(chunks))
+
+        level = options['level']
+        modes = [
+            ('msgpack', lambda fname: self.write_msgpack(fname, chunks),
+             self.count_msgpack),
+            ('msgpack+gzip', lambda fname: self.write_msgpack(fname, chunks, gzip.open),
+             lambda fname: self.count_msgpack(fname, gzip.open)),
+            ('frames:raw', lambda fname: self.write_frames(fname, chunks, 'raw', level),
+             self.count_frames),
+            ('frames:zstd', lambda fname: self.write_frames(fname, chunks, 'zstd', level),
+             self.count_frames),
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir, Pool(options['workers']) as pool:
+            modes.append(('frames:zstd parallel', modes[-1][1],
+                          lambda fname: self.count_frames(fname, pool=pool)))
+            base_size = None
+            for i, (name, write, read) in enumerate(modes):
+                fname = os.path.join(tmp_dir, str(i))
+                start = time.time()
+                write(fname)
+                write_time = time.time() - start
+                size = os.path.getsize(fname)
+                base_size = base_size or size
+
+                start = time.time()
+                num_read = read(fname)
+                read_time = time.time() - start
+                _LOG.info('%-20s size:%.1fMB (%.1fx smaller) write:%.2fs read:%.2fs (%.0f tweets/s) tweets:%s',
+                          name, size / 1024 / 1024, base_size / size, write_time, read_time,
+                          num_read / read_time if read_time else 0, num_read)
@@ -0,0 +1,16 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from mnemonic.news.utils.cache_backends import PackedSegmentCacheBackend
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help="Include segments that have already been backed up")
+
+    def handle(self, *args, **options):
+        for path in PackedSegmentCacheBackend().get_closed_segments():
+            if options['all'] or not os.path.exists(path + '.backed_up'):
+                self.stdout.write(path)
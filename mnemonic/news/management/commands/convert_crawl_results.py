@@ -0,0 +1,32 @@
+import glob
+import logging
+import os
+
+from django.core.management.base import BaseCommand
+
+from mnemonic.news.utils.twitter_utils import convert_legacy_results
+
+_LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default='state/twint', type=str,
+                            help="Directory holding the crawl results")
+        parser.add_argument('--block-size', default=25 * 1000, type=int,
+                            help="Number of tweets per block")
+        parser.add_argument('--keep', action='store_true',
+                            help="Keep the old files instead of deleting them once converted")
+
+    def handle(self, *args, **options):
+        legacy_fnames = (glob.glob(os.path.join(options['dir'], 'results_*.msgpack')) +
+                         glob.glob(os.path.join(options['dir'], 'results_*.msgpack.gz')))
+        for legacy_fname in sorted(legacy_fnames):
+            fname = legacy_fname.rsplit('.msgpack', 1)[0] + '.blocks'
+            _LOG.info('converting [%s] to [%s]', legacy_fname, fname)
+            convert_legacy_results(legacy_fname, fname, block_size=options['block_size'])
+            # CrawlBuffer reads both files so the old one has to go to avoid duplicates
+            if options['keep']:
+                os.rename(legacy_fname, legacy_fname + '.converted')
+            else:
+                os.remove(legacy_fname)
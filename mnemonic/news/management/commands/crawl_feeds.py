@@ -1,9 +1,61 @@
+import logging
+import time
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
 
 from mnemonic.news.models import Feed
+from mnemonic.news.utils.feed_utils import crawl_feeds_concurrently
+
+_LOG = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrent', action='store_true',
+                            help="Fetch all feeds concurrently and parse them in a worker pool")
+        parser.add_argument('--due', action='store_true',
+                            help="Only crawl feeds that are due as per their polling schedule")
+        parser.add_argument('--concurrency', default=settings.FEED_CRAWL_CONCURRENCY, type=int,
+                            help="Max number of feeds being fetched at once")
+        parser.add_argument('--concurrency-per-host', default=settings.FEED_CRAWL_CONCURRENCY_PER_HOST, type=int,
+                            help="Max number of feeds being fetched at once from the same host")
+        parser.add_argument('--workers', default=settings.FEED_PARSE_WORKERS, type=int,
+                            help="Number of feed parsing processes (defaults to the number of CPUs)")
+
     def handle(self, *args, **options):
-        for feed in Feed.objects.all():
-            feed.crawl_feed()
+        if options['due']:
+            # leased so that a run that overlaps this one skips them
+            feeds = Feed.objects.filter(pk__in=[feed.pk for feed in Feed.lease_due_feeds()])
+        else:
+            feeds = Feed.objects.all()
+
+        if options['concurrent']:
+            self.crawl_concurrently(feeds.filter(is_archive=False), **options)
+        else:
+            for feed in feeds:
+                feed.crawl_feed()
+
+    def crawl_concurrently(self, feeds, concurrency, concurrency_per_host, workers, **options):
+        start = time.time()
+        results = crawl_feeds_concurrently(feeds,
+                                           concurrency=concurrency,
+                                           concurrency_per_host=concurrency_per_host,
+                                           workers=workers)
+        crawl_time = time.time() - start
+
+        for result in results:
+            if result.is_ok and not result.is_unchanged:
+                result.feed.process_entries(result.entries)
+                result.feed.update_crawl_validators(result.headers, result.content_hash)
+            result.feed.schedule_next_crawl(error=result.error)
+
+        ok = [result for result in results if result.is_ok]
+        _LOG.info('crawled %s feed(s) (%s failed, %s unchanged) in %.2fs, processed entries in %.2fs',
+                  len(results), len(results) - len(ok), sum(result.is_unchanged for result in ok),
+                  crawl_time, time.time() - start - crawl_time)
+        if ok:
+            slowest = max(ok, key=lambda result: result.fetch_time)
+            _LOG.info('fetch time - total:%.2fs slowest:%.2fs [%s], parse time - total:%.2fs',
+                      sum(result.fetch_time for result in ok), slowest.fetch_time, slowest.feed,
+                      sum(result.parse_time for result in ok))
@@ -0,0 +1,36 @@
+from datetime import date
+import logging
+
+from django.core.management.base import BaseCommand
+
+from mnemonic.news.search_indices import News
+from mnemonic.news.utils.search_utils import get_connection
+
+_LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', default=3, type=int,
+                            help="Freeze partitions that ended more than this many months ago")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        es = get_connection()
+        today = date.today()
+        month = today.year * 12 + today.month - 1 - options['older_than']
+        cutoff = News.get_index_name(date(month // 12, month % 12 + 1, 1))
+
+        prefix = News.get_index_prefix()
+        indices = es.indices.get_settings(index=prefix + '-*', name='index.blocks.write')
+        for name, d in sorted(indices.items()):
+            partition = name[len(prefix) + 1:]
+            if not partition[:4].isdigit() or name >= cutoff:
+                continue
+            if d['settings'].get('index', {}).get('blocks', {}).get('write') == 'true':
+                continue
+
+            _LOG.info('freezing index:[%s]', name)
+            if not options['dry_run']:
+                es.indices.forcemerge(index=name, max_num_segments=1, request_timeout=60 * 60)
+                es.indices.put_settings(index=name, body={'index.blocks.write': True})
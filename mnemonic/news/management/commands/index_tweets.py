@@ -0,0 +1,26 @@
+import logging
+import os
+
+from django.core.management.base import BaseCommand
+
+from mnemonic.news.models import TwitterJob
+from mnemonic.news.utils.search_utils import bulk_load_mode
+
+_LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default=os.cpu_count(), type=int,
+                            help="Number of TwitterJobs indexed at once")
+        parser.add_argument('--bulk-load', action='store_true',
+                            help="Turn off refreshes and replicas while indexing. For large backfills")
+
+    def handle(self, *args, **options):
+        ids = list(TwitterJob.objects.filter(is_crawled=True, is_pushed_to_index=False).values_list('pk', flat=True))
+        _LOG.info('indexing %s TwitterJob(s) with %s worker(s)', len(ids), options['workers'])
+        if options['bulk_load']:
+            with bulk_load_mode():
+                TwitterJob.index_many(ids, workers=options['workers'])
+        else:
+            TwitterJob.index_many(ids, workers=options['workers'])
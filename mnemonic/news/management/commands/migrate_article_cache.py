@@ -0,0 +1,33 @@
+import logging
+
+from tqdm import tqdm
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from mnemonic.news.utils.class_utils import get_object_from_python_path
+
+_LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--from-backend', default='mnemonic.news.utils.cache_backends.FileCacheBackend',
+                            type=str, help="Python path to the cache backend to copy from")
+        parser.add_argument('--to-backend', default=settings.ARTICLE_CACHE_BACKEND, type=str,
+                            help="Python path to the cache backend to copy to")
+        parser.add_argument('--delete', action='store_true',
+                            help="Delete entries from the old backend once they are copied. "
+                                 "Makes an interrupted migration resumable")
+
+    def handle(self, *args, **options):
+        src = get_object_from_python_path(options['from_backend'])()
+        dst = get_object_from_python_path(options['to_backend'])()
+        count = 0
+        for key in tqdm(src.keys(), desc='migrating article cache'):
+            info = src.get_info(key) or {}
+            dst.write(key, src.read(key), url=info.get('url'), fetched_on=info.get('fetched_on'))
+            if options['delete']:
+                src.delete(key)
+            count += 1
+        _LOG.info('migrated [%s] entries from [%s] to [%s]', count, options['from_backend'], options['to_backend'])
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+
+from mnemonic.news.models import IndexingError
+from mnemonic.news.utils.class_utils import get_object_from_python_path
+from mnemonic.news.utils.search_utils import bulk_load_mode
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default='mnemonic.news.models.Article', type=str,
+                            help="Python path to the NewsIndexable model to index")
+        parser.add_argument('--threads', default=settings.INDEX_BULK_THREAD_COUNT, type=int,
+                            help="Number of bulk requests in flight at once")
+        parser.add_argument('--chunk-size', default=settings.INDEX_BULK_CHUNK_SIZE, type=int,
+                            help="Max number of documents per bulk request")
+        parser.add_argument('--max-chunk-bytes', default=settings.INDEX_BULK_MAX_CHUNK_BYTES, type=int,
+                            help="Max size of a bulk request in bytes")
+        parser.add_argument('--retry-failed', action='store_true',
+                            help="Clear recorded indexing errors so that those documents are sent again")
+        parser.add_argument('--bulk-load', action='store_true',
+                            help="Turn off refreshes and replicas while indexing. For large backfills")
+        parser.add_argument('--translog-async', action='store_true',
+                            help="With --bulk-load, also skip the translog fsync on every request")
+        parser.add_argument('--force-merge', type=int,
+                            help="With --bulk-load, force merge to this many segments afterwards")
+
+    def handle(self, *args, **options):
+        model = get_object_from_python_path(options['model'])
+        if options['retry_failed']:
+            IndexingError.objects.filter(content_type=ContentType.objects.get_for_model(model)).delete()
+        if options['bulk_load']:
+            with bulk_load_mode(translog_async=options['translog_async'], force_merge=options['force_merge']):
+                self.push(model, **options)
+        else:
+            self.push(model, **options)
+
+    def push(self, model, threads, chunk_size, max_chunk_bytes, **options):
+        model.bulk_push_to_index(thread_count=threads, chunk_size=chunk_size, max_chunk_bytes=max_chunk_bytes)
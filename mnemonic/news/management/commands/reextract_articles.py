@@ -0,0 +1,122 @@
+import json
+import logging
+from multiprocessing import Pool
+import os
+import time
+
+from dateutil.parser import parse as parse_date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from mnemonic.news.models import Article
+from mnemonic.news.utils.article_utils import get_body_from_cache
+from mnemonic.news.utils.file_utils import ShelveFile
+
+_LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--feed', type=int, help="Only re-extract articles from this feed id")
+        parser.add_argument('--source', type=str, help="Only re-extract articles from this news source name")
+        parser.add_argument('--since', type=parse_date, help="Only re-extract articles published on or after this date")
+        parser.add_argument('--until', type=parse_date, help="Only re-extract articles published before this date")
+        parser.add_argument('--only-empty', action='store_true', help="Only re-extract articles without a body")
+        parser.add_argument('--batch-size', default=1000, type=int,
+                            help="Number of articles read and written per query")
+        parser.add_argument('--workers', default=os.cpu_count(), type=int,
+                            help="Number of extraction processes")
+        parser.add_argument('--checkpoint', default=settings.ARTICLE_REEXTRACT_CHECKPOINT, type=str,
+                            help="File that progress is saved to after every batch")
+        parser.add_argument('--restart', action='store_true',
+                            help="Ignore the checkpoint and start from the first article")
+
+    @staticmethod
+    def get_queryset(feed=None, source=None, since=None, until=None, only_empty=False, **options):
+        qs = Article.objects.all()
+        if feed:
+            qs = qs.filter(feed_id=feed)
+        if source:
+            qs = qs.filter(feed__source__name=source)
+        if since:
+            qs = qs.filter(published_on__gte=since)
+        if until:
+            qs = qs.filter(published_on__lt=until)
+        if only_empty:
+            qs = qs.filter(body__isnull=True)
+        return qs
+
+    @staticmethod
+    def get_filters(options):
+        # a checkpoint is only resumed by a run over the same set of articles
+        return {k: str(options[k]) if options[k] is not None else None
+                for k in ('feed', 'source', 'since', 'until', 'only_empty')}
+
+    @staticmethod
+    def load_checkpoint(path, filters):
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if checkpoint['filters'] != filters:
+            _LOG.warning('checkpoint:[%s] is for a different set of articles - ignoring it', path)
+            return
+        return checkpoint
+
+    @staticmethod
+    def save_checkpoint(path, checkpoint):
+        with ShelveFile(path, temp_dir=os.path.dirname(path) or None) as f:
+            json.dump(checkpoint, f)
+
+    def handle(self, *args, **options):
+        filters = self.get_filters(options)
+        checkpoint = None if options['restart'] else self.load_checkpoint(options['checkpoint'], filters)
+        if checkpoint is None:
+            checkpoint = {'filters': filters, 'last_pk': 0, 'num_processed': 0, 'num_updated': 0, 'num_missing': 0}
+        else:
+            _LOG.info('resuming from article:[%s]', checkpoint['last_pk'])
+
+        qs = self.get_queryset(**options)
+        num_remaining = qs.filter(pk__gt=checkpoint['last_pk']).count()
+        _LOG.info('re-extracting %s article(s)', num_remaining)
+
+        # workers are forked and mustn't share the parent's db connections
+        connections.close_all()
+        start = time.time()
+        num_done = 0
+        with Pool(options['workers']) as pool:
+            while True:
+                batch = list(qs.filter(pk__gt=checkpoint['last_pk'])
+                               .order_by('pk')
+                               .values_list('pk', 'url', 'body')[:options['batch_size']])
+                if not batch:
+                    break
+
+                bodies = pool.map(get_body_from_cache, [url for pk, url, body in batch], chunksize=16)
+                now = timezone.now()
+                updated = []
+                for (pk, url, old_body), body in zip(batch, bodies):
+                    if body is None:
+                        checkpoint['num_missing'] += 1
+                    elif body != old_body:
+                        updated.append(Article(pk=pk, body=body, updated_on=now, is_pushed_to_index=False))
+                Article.objects.bulk_update(updated, ['body', 'updated_on', 'is_pushed_to_index'])
+
+                checkpoint['last_pk'] = batch[-1][0]
+                checkpoint['num_processed'] += len(batch)
+                checkpoint['num_updated'] += len(updated)
+                self.save_checkpoint(options['checkpoint'], checkpoint)
+
+                num_done += len(batch)
+                elapsed = time.time() - start
+                rate = num_done / elapsed
+                _LOG.info('processed %s/%s article(s) - updated:%s missing html:%s - %.1f articles/s, eta:%.0fs',
+                          num_done, num_remaining, checkpoint['num_updated'], checkpoint['num_missing'],
+                          rate, (num_remaining - num_done) / rate if rate else 0)
+
+        _LOG.info('done - processed:%s updated:%s missing html:%s in %.2fs',
+                  checkpoint['num_processed'], checkpoint['num_updated'], checkpoint['num_missing'],
+                  time.time() - start)
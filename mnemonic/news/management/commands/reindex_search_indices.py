@@ -0,0 +1,199 @@
+import logging
+from multiprocessing import Pool
+import os
+import time
+
+from elasticsearch import Elasticsearch
+from elasticsearch.helpers import scan, streaming_bulk
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+
+from mnemonic.news.models import Article
+from mnemonic.news.search_indices import News
+from mnemonic.news.utils.search_utils import bulk_load_mode
+
+_LOG = logging.getLogger(__name__)
+
+
+def _send(es, actions):
+    num_ok = num_errors = 0
+    for ok, item in streaming_bulk(es, actions,
+                                   chunk_size=settings.INDEX_BULK_CHUNK_SIZE,
+                                   max_chunk_bytes=settings.INDEX_BULK_MAX_CHUNK_BYTES,
+                                   raise_on_error=False,
+                                   max_retries=3,
+                                   request_timeout=settings.INDEX_BULK_REQUEST_TIMEOUT):
+        if ok:
+            num_ok += 1
+        else:
+            op_type, info = item.popitem()
+            # documents written by live indexers since the copy started are newer
+            if info.get('status') != 409:
+                num_errors += 1
+                _LOG.warning('error copying doc:[%s] - %s', info.get('_id'), info.get('error'))
+    return num_ok, num_errors
+
+
+TWEETS_QUERY = {'term': {'source_type': 'tweet'}}
+
+
+def run_job(job):
+    fn, args = job
+    return fn(args)
+
+
+def copy_slice(args):
+    """
+    copies one slice of the source index into the partitions of version
+    """
+    src, slice_id, num_slices, version, query = args
+    es = Elasticsearch(settings.ELASTICSEARCH_HOSTS)
+    query = {'query': query or {'match_all': {}}}
+    if num_slices > 1:
+        query['slice'] = {'id': slice_id, 'max': num_slices}
+    hits = scan(es, index=src, query=query, size=2000, scroll='10m', preserve_order=False)
+    actions = ({'_op_type': 'create',
+                '_index': News.get_index_name(hit['_source'].get('published_on'), version),
+                '_id': hit['_id'],
+                '_source': hit['_source']} for hit in hits)
+    return _send(es, actions)
+
+
+def copy_pk_range(args):
+    """
+    indexes articles with start <= pk < end from postgres into the partitions of version
+    """
+    start, end, version = args
+    es = Elasticsearch(settings.ELASTICSEARCH_HOSTS)
+    qs = Article.objects.filter(pk__gte=start, pk__lt=end)
+    actions = Article.get_bulk_index_actions(qs=qs)
+
+    def reroute(action):
+        action['_index'] = News.get_index_name(action['_source'].get('published_on'), version)
+        return action
+
+    return _send(es, (reroute(action) for action in actions))
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=['index', 'db'], default='index',
+                            help="Copy documents from the current indices (default) or rebuild articles from "
+                                 "postgres. Tweets only exist in the index so they are always copied from it")
+        parser.add_argument('--from-index', default=settings.NEWS_INDEX_READ_ALIAS, type=str,
+                            help="Index or alias to copy from")
+        parser.add_argument('--index-version', default=settings.NEWS_INDEX_VERSION, type=int,
+                            help="Version of the indices to build. Bump NEWS_INDEX_VERSION and deploy before "
+                                 "reindexing - new documents are then written to both versions while searches "
+                                 "stay on the version the alias points at until the swap")
+        parser.add_argument('--workers', default=os.cpu_count(), type=int,
+                            help="Number of processes. Also the number of scroll slices / pk ranges")
+        parser.add_argument('--max-missing', default=0, type=int,
+                            help="Number of documents the new indices can be short by and still be swapped in")
+        parser.add_argument('--no-swap', action='store_true',
+                            help="Build and verify the new indices but don't point the alias at them")
+
+    def get_jobs(self, es, source, from_index, version, workers):
+        if source == 'index':
+            return [(copy_slice, (from_index, i, workers, version, None)) for i in range(workers)]
+
+        # tweets aren't in postgres - without them the swap would drop every tweet
+        jobs = []
+        if es.indices.exists(index=from_index):
+            jobs = [(copy_slice, (from_index, i, workers, version, TWEETS_QUERY)) for i in range(workers)]
+        bounds = Article.objects.aggregate(start=Min('pk'), end=Max('pk'))
+        if bounds['start'] is not None:
+            step = (bounds['end'] - bounds['start']) // workers + 1
+            jobs.extend((copy_pk_range, (start, start + step, version))
+                        for start in range(bounds['start'], bounds['end'] + 1, step))
+        return jobs
+
+    def get_expected_count(self, es, source, from_index):
+        if source == 'index':
+            return es.count(index=from_index)['count']
+        num_tweets = 0
+        if es.indices.exists(index=from_index):
+            num_tweets = es.count(index=from_index, body={'query': TWEETS_QUERY})['count']
+        return Article.objects.count() + num_tweets
+
+    def get_actual_count(self, es, pattern):
+        es.indices.refresh(index=pattern)
+        return es.count(index=pattern)['count']
+
+    @staticmethod
+    def get_mismatched_partitions(es, pattern):
+        """
+        partitions of the new version that were created before its template
+        was installed and so got dynamic mappings
+        """
+        expected = News._doc_type.mapping.to_dict()['properties']
+        mismatched = []
+        for index, d in es.indices.get_mapping(index=pattern).items():
+            actual = d['mappings'].get('properties', {})
+            for field, mapping in expected.items():
+                if {k: actual.get(field, {}).get(k) for k in mapping} != mapping:
+                    mismatched.append(index)
+                    break
+        return mismatched
+
+    def swap_alias(self, es, version):
+        alias = settings.NEWS_INDEX_READ_ALIAS
+        prefix = News.get_index_prefix(version)
+        pattern = prefix + '-*'
+        actions = [{'add': {'index': pattern, 'alias': alias}}]
+        if es.indices.exists_alias(name=alias):
+            old = [name for name in es.indices.get_alias(name=alias) if not name.startswith(prefix + '-')]
+            actions = [{'remove': {'index': name, 'alias': alias}} for name in old] + actions
+        elif es.indices.exists(index=alias):
+            # an index from before partitioning holds the alias' name
+            _LOG.info('deleting unpartitioned index:[%s] to free up its name for the alias', alias)
+            actions = [{'remove_index': {'index': alias}}] + actions
+        es.indices.update_aliases(body={'actions': actions})
+
+        # old templates would keep adding partitions created by stale writers to the alias
+        for name in es.indices.get_template(name=settings.NEWS_INDEX_PREFIX + '-v*'):
+            if name != prefix:
+                es.indices.delete_template(name=name)
+
+    def handle(self, *args, **options):
+        es = Elasticsearch(settings.ELASTICSEARCH_HOSTS)
+        version = options['index_version']
+        pattern = News.get_index_prefix(version) + '-*'
+        if options['source'] == 'index' and es.indices.exists_alias(name=options['from_index'], index=pattern):
+            raise CommandError('alias:[%s] already points at version:[%s]. Bump NEWS_INDEX_VERSION first'
+                               % (options['from_index'], version))
+
+        News.init_template(version=version, with_alias=False)
+        mismatched = self.get_mismatched_partitions(es, pattern)
+        if mismatched:
+            raise CommandError('[%s] have mappings that differ from the template. Run create_search_indices on '
+                               'deploy so that the template exists before anything writes to them, then delete '
+                               'them and re-index what was written to them' % ', '.join(sorted(mismatched)))
+        expected = self.get_expected_count(es, options['source'], options['from_index'])
+        jobs = self.get_jobs(es, options['source'], options['from_index'], version, options['workers'])
+        _LOG.info('reindexing %s doc(s) from %s into [%s] with %s job(s)', expected, options['source'], pattern, len(jobs))
+
+        # workers are forked and mustn't share the parent's db connections
+        connections.close_all()
+        start = time.time()
+        # the new indices aren't searched until the swap so they can be loaded without refreshes or replicas
+        with bulk_load_mode(pattern, translog_async=True), Pool(options['workers']) as pool:
+            results = pool.map(run_job, jobs)
+        num_ok = sum(ok for ok, errors in results)
+        num_errors = sum(errors for ok, errors in results)
+        elapsed = time.time() - start
+        _LOG.info('copied %s doc(s) with %s error(s) in %.2fs (%.1f docs/s)',
+                  num_ok, num_errors, elapsed, num_ok / elapsed if elapsed else 0)
+
+        actual = self.get_actual_count(es, pattern)
+        if actual < expected - options['max_missing']:
+            raise CommandError('[%s] has %s doc(s), expected %s. Not swapping the alias' % (pattern, actual, expected))
+        _LOG.info('[%s] has %s doc(s), expected %s', pattern, actual, expected)
+
+        if not options['no_swap']:
+            self.swap_alias(es, version)
+            News.init_template(version=version, with_alias=True)
+            _LOG.info('alias:[%s] now points at [%s]', settings.NEWS_INDEX_READ_ALIAS, pattern)
@@ -0,0 +1,46 @@
+import logging
+import select
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from mnemonic.news.models import IndexOutbox
+
+_LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', default=settings.INDEX_OUTBOX_BATCH_SIZE, type=int,
+                            help="Number of outbox rows indexed per bulk run")
+        parser.add_argument('--poll-interval', default=settings.INDEX_OUTBOX_POLL_INTERVAL, type=float,
+                            help="Seconds to wait for a notification before checking the outbox anyway")
+        parser.add_argument('--once', action='store_true',
+                            help="Drain the outbox and exit instead of waiting for new rows")
+
+    @staticmethod
+    def listen(channel):
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            cursor.execute('LISTEN %s' % channel)
+        return connection.connection
+
+    @staticmethod
+    def wait(conn, timeout):
+        # notifications that arrived during the drain may already have been read
+        # off the socket, in which case select() would sit out the whole timeout
+        conn.poll()
+        if not conn.notifies and select.select([conn], [], [], timeout)[0]:
+            conn.poll()
+        del conn.notifies[:]
+
+    def handle(self, *args, **options):
+        # subscribe before the first drain so that rows written in between aren't missed
+        conn = None if options['once'] else self.listen(settings.INDEX_OUTBOX_CHANNEL)
+        while True:
+            while IndexOutbox.drain(options['batch_size']) == options['batch_size']:
+                pass
+            if options['once']:
+                return
+            self.wait(conn, options['poll_interval'])
@@ -0,0 +1,13 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from mnemonic.news.models import Feed
+
+_LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    def handle(self, *args, **options):
+        feeds = Feed.crawl_due_feeds_async()
+        _LOG.info('queued crawl for [%s] due feed(s)', len(feeds))
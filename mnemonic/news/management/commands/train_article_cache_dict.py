@@ -0,0 +1,33 @@
+import itertools
+import logging
+
+from tqdm import tqdm
+import zstandard
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from mnemonic.news.utils.cache_backends import ZstdDictionaries
+from mnemonic.news.utils.class_utils import get_object_from_python_path
+
+_LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', default=settings.ARTICLE_CACHE_BACKEND, type=str,
+                            help="Python path to the cache backend to sample pages from. Use "
+                                 "mnemonic.news.utils.cache_backends.FileCacheBackend to train on the "
+                                 "legacy cache before migrating it")
+        parser.add_argument('--samples', default=10 * 1000, type=int,
+                            help="Number of cached pages to train on")
+        parser.add_argument('--dict-size', default=110 * 1024, type=int,
+                            help="Size of the dictionary in bytes")
+
+    def handle(self, *args, **options):
+        backend = get_object_from_python_path(options['backend'])()
+        keys = list(itertools.islice(backend.keys(), options['samples']))
+        samples = [backend.read(key).encode('utf-8') for key in tqdm(keys, desc='reading samples')]
+        zstd_dict = zstandard.train_dictionary(options['dict_size'], samples)
+        dict_id = ZstdDictionaries().save(zstd_dict)
+        _LOG.info('trained dictionary:[%s] on [%s] pages', dict_id, len(samples))
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.12 on 2026-10-18 12:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0018_auto_20210313_2135'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feed',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='etag',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='last_modified',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.12 on 2026-10-18 16:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0019_auto_20261018_1204'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feed',
+            name='crawl_error_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='last_crawled_on',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='next_crawl_on',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.1.12 on 2026-10-18 19:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('news', '0020_auto_20261018_1631'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexingError',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('object_id', models.PositiveIntegerField()),
+                ('status', models.CharField(max_length=16)),
+                ('error', models.TextField()),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'unique_together': {('content_type', 'object_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 3.1.12 on 2026-10-18 19:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+CREATE_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION news_article_index_outbox() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO news_indexoutbox (content_type_id, object_id, created_on)
+    SELECT id, NEW.id, now() FROM django_content_type WHERE app_label = 'news' AND model = 'article';
+    PERFORM pg_notify('news_index_outbox', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER news_article_index_outbox_insert
+    AFTER INSERT ON news_article
+    FOR EACH ROW EXECUTE PROCEDURE news_article_index_outbox();
+
+CREATE TRIGGER news_article_index_outbox_update
+    AFTER UPDATE ON news_article
+    FOR EACH ROW
+    WHEN (OLD.title IS DISTINCT FROM NEW.title
+          OR OLD.body IS DISTINCT FROM NEW.body
+          OR OLD.published_on IS DISTINCT FROM NEW.published_on
+          OR OLD.url IS DISTINCT FROM NEW.url
+          OR OLD.feed_id IS DISTINCT FROM NEW.feed_id)
+    EXECUTE PROCEDURE news_article_index_outbox();
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS news_article_index_outbox_update ON news_article;
+DROP TRIGGER IF EXISTS news_article_index_outbox_insert ON news_article;
+DROP FUNCTION IF EXISTS news_article_index_outbox();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('news', '0021_indexingerror'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexOutbox',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('object_id', models.PositiveIntegerField()),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(condition=models.Q(is_pushed_to_index=False), fields=['id'], name='news_article_unpushed_idx'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER_SQL, DROP_TRIGGER_SQL),
+    ]
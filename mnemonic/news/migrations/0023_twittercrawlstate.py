@@ -0,0 +1,30 @@
+# Generated by Django 3.1.12 on 2026-10-18 21:14
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0022_auto_20261018_1937'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TwitterCrawlState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('handle', models.CharField(max_length=256)),
+                ('mentions', models.BooleanField(default=False)),
+                ('max_tweet_id', models.BigIntegerField(blank=True, null=True)),
+                ('max_datetime', models.DateTimeField(blank=True, null=True)),
+                ('crawled_ranges', django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=list)),
+            ],
+            options={
+                'unique_together': {('handle', 'mentions')},
+            },
+        ),
+    ]
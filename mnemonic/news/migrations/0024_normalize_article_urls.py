@@ -0,0 +1,62 @@
+# Generated by Django 3.1.12 on 2026-10-19 10:05
+
+from django.db import migrations
+
+CHUNK_SIZE = 5000
+
+
+def clean_url(url, source_name):
+    # a copy of Article.clean_url - migrations can't call model methods
+    import urllib.parse as urlparse
+    from urlnormalizer import normalize_url
+
+    if source_name == 'Google News India':
+        parsed = urlparse.urlparse(url)
+        if parsed.netloc == 'news.google.com':
+            url = urlparse.parse_qs(parsed.query).get('url', [url])[0]
+    return normalize_url(url)
+
+
+def normalize_article_urls(apps, schema_editor):
+    Article = apps.get_model('news', 'Article')
+    num_updated = num_collisions = 0
+    last_pk = 0
+    while True:
+        rows = list(Article.objects.filter(pk__gt=last_pk)
+                                   .order_by('pk')
+                                   .values_list('pk', 'url', 'feed__source__name')[:CHUNK_SIZE])
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+        changed = {}
+        for pk, url, source_name in rows:
+            try:
+                new_url = clean_url(url, source_name)
+            except Exception:
+                continue
+            if new_url != url:
+                changed[pk] = new_url
+        taken = set(Article.objects.filter(url__in=changed.values()).values_list('url', flat=True))
+        articles = []
+        for pk, new_url in changed.items():
+            # the normalized url already belongs to another row - leave this one as it is
+            if new_url in taken:
+                num_collisions += 1
+                continue
+            taken.add(new_url)
+            articles.append(Article(pk=pk, url=new_url))
+        Article.objects.bulk_update(articles, ['url'])
+        num_updated += len(articles)
+    print('Normalized urls of [%s] Articles, left [%s] that collide with an existing url' %
+          (num_updated, num_collisions))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0023_twittercrawlstate'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_article_urls, migrations.RunPython.noop)
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 3.1.12 on 2026-10-19 11:20
+
+from django.db import migrations, models
+
+CREATE_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION news_article_index_outbox() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO news_indexoutbox (content_type_id, object_id, is_delete, created_on)
+    SELECT id, NEW.id, false, now() FROM django_content_type WHERE app_label = 'news' AND model = 'article';
+    PERFORM pg_notify('news_index_outbox', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION news_article_index_outbox_delete() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO news_indexoutbox (content_type_id, object_id, is_delete, published_on, created_on)
+    SELECT id, OLD.id, true, OLD.published_on, now() FROM django_content_type
+    WHERE app_label = 'news' AND model = 'article';
+    PERFORM pg_notify('news_index_outbox', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER news_article_index_outbox_delete
+    AFTER DELETE ON news_article
+    FOR EACH ROW EXECUTE PROCEDURE news_article_index_outbox_delete();
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS news_article_index_outbox_delete ON news_article;
+DROP FUNCTION IF EXISTS news_article_index_outbox_delete();
+
+CREATE OR REPLACE FUNCTION news_article_index_outbox() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO news_indexoutbox (content_type_id, object_id, created_on)
+    SELECT id, NEW.id, now() FROM django_content_type WHERE app_label = 'news' AND model = 'article';
+    PERFORM pg_notify('news_index_outbox', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0024_normalize_article_urls'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='indexoutbox',
+            name='is_delete',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='indexoutbox',
+            name='published_on',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER_SQL, DROP_TRIGGER_SQL),
+    ]
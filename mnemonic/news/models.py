@@ -1,21 +1,24 @@
 from __future__ import unicode_literals
 
-from datetime import datetime
+from collections import defaultdict
+from datetime import date, datetime, timedelta
 import logging
-import pytz
 from time import mktime, struct_time
 import urllib.parse as urlparse
 
 import feedparser
+import requests
 from tqdm import tqdm
+from urlnormalizer import normalize_url
 
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.postgres.fields import JSONField
 from django.core.serializers.json import DjangoJSONEncoder
-from django.db import models
-from django.db.utils import IntegrityError
+from django.db import models, transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
 
 from mnemonic.entity.models import EntityBase
 from mnemonic.news.search_indices import NewsIndexable
@@ -42,19 +45,66 @@ class Feed(BaseModel):
     source = models.ForeignKey(NewsSource, on_delete=models.CASCADE)
     is_top_news = models.BooleanField()
     is_archive = models.BooleanField(default=False)
+    etag = models.TextField(blank=True, null=True)
+    last_modified = models.TextField(blank=True, null=True)
+    content_hash = models.CharField(max_length=32, blank=True, null=True)
+    last_crawled_on = models.DateTimeField(blank=True, null=True)
+    next_crawl_on = models.DateTimeField(blank=True, null=True, db_index=True)
+    crawl_error_count = models.PositiveIntegerField(default=0)
 
     objects = CachedManager()
 
     def __str__(self):
         return '%s:%s' % (self.source, self.name)
 
+    def get_crawl_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def is_unchanged(self, status, content_hash):
+        return status == 304 or (self.content_hash is not None and self.content_hash == content_hash)
+
+    def update_crawl_validators(self, headers, content_hash):
+        self.etag = headers.get('etag')
+        self.last_modified = headers.get('last-modified')
+        self.content_hash = content_hash
+        self.save(update_fields=['etag', 'last_modified', 'content_hash'])
+
     def crawl_feed(self):
+        from mnemonic.news.utils.download_utils import get_downloader
+        from mnemonic.news.utils.feed_utils import get_content_hash
+
         if self.is_archive:
             _LOG.warning('cant crawl archive feed')
             return
 
-        d = feedparser.parse(self.url)
-        for entry in d['entries']:
+        try:
+            r = get_downloader().get(self.url, headers=self.get_crawl_headers(), timeout=settings.FEED_CRAWL_TIMEOUT)
+            r.raise_for_status()
+        except requests.RequestException as ex:
+            _LOG.warning('feed:[%s] - error crawling url:[%s] - %s', self, self.url, ex)
+            self.schedule_next_crawl(error=ex)
+            return
+
+        content_hash = get_content_hash(r.content)
+        if self.is_unchanged(r.status_code, content_hash):
+            _LOG.info('feed:[%s] - unchanged', self)
+        else:
+            d = feedparser.parse(r.content, response_headers={k.lower(): v for k, v in r.headers.items()})
+            self.process_entries(d['entries'])
+            self.update_crawl_validators(r.headers, content_hash)
+        self.schedule_next_crawl()
+
+    def process_entries(self, entries):
+        from mnemonic.news.utils.cache_utils import get_seen_url_index
+
+        articles = {}
+        raw_urls = set()
+        for entry in entries:
             try:
                 url = entry.pop('link')
                 published_on = entry.pop('published_parsed')
@@ -64,29 +114,90 @@ class Feed(BaseModel):
                 continue
             if isinstance(published_on, struct_time):
                 published_on = datetime.fromtimestamp(mktime(published_on))
-            try:
-                a = Article.objects.create(feed=self,
-                                           url=url,
-                                           title=title,
-                                           summary=summary,
-                                           published_on=published_on,
-                                           is_top_news=self.is_top_news,
-                                           metadata=entry)
-            except IntegrityError as ex:
-                if 'duplicate key value violates unique constraint' in ex.args[0]:
-                    _LOG.info('Article with url:[%s] exists', url)
-                else:
-                    raise ex
-            else:
-                _LOG.info('Article created with url:[%s]', url)
-                a.process_async()
-
-    def crawl_feed_async(self):
+            a = Article(feed=self,
+                        url=Article.clean_url(url, self),
+                        title=title,
+                        summary=summary,
+                        published_on=published_on,
+                        is_top_news=self.is_top_news,
+                        metadata=entry)
+            articles.setdefault(a.url, a)
+            raw_urls.add(url)
+
+        seen_url_index = get_seen_url_index()
+        candidates = set(articles.keys()) - seen_url_index.contains_many(articles.keys())
+        if candidates:
+            # the index can lag behind the db and rows created before urls were
+            # normalized are stored with the raw url
+            existing = set(Article.objects.filter(url__in=raw_urls.union(candidates))
+                                          .values_list('url', flat=True))
+            existing.update([Article.clean_url(url, self) for url in existing])
+            seen_url_index.add_many(existing)
+        else:
+            existing = set()
+        new_articles = [articles[url] for url in candidates if url not in existing]
+        _LOG.info('feed:[%s] - %s entries, %s new', self, len(articles), len(new_articles))
+        if new_articles:
+            Article.objects.bulk_create(new_articles, ignore_conflicts=True)
+            seen_url_index.add_many([a.url for a in new_articles])
+            articles = Article.objects.filter(url__in=[a.url for a in new_articles])\
+                                      .values_list('pk', 'url')
+            Article.process_async_bulk(articles)
+
+    def crawl_feed_async(self, queued_on=None):
         from mnemonic.news.tasks import crawl_feed_async
-        crawl_feed_async.apply_async(kwargs={'feed_id': self.pk},
+        crawl_feed_async.apply_async(kwargs={'feed_id': self.pk, 'queued_on': queued_on},
                                      queue=settings.CELERY_TASK_QUEUE_CRAWL_FEED,
                                      routing_key=settings.CELERY_TASK_ROUTING_KEY_CRAWL_FEED)
 
+    def schedule_next_crawl(self, error=None):
+        from mnemonic.news.utils.schedule_utils import get_crawl_interval
+
+        now = timezone.now()
+        since = now - timedelta(days=settings.FEED_CRAWL_HISTORY_DAYS)
+        stats = self.article_set.aggregate(num_articles=Count('pk', filter=Q(created_on__gte=since)),
+                                           last_article_on=Max('created_on'))
+        self.crawl_error_count = self.crawl_error_count + 1 if error else 0
+        interval = get_crawl_interval(stats['num_articles'],
+                                      stats['last_article_on'] or self.created_on,
+                                      error_count=self.crawl_error_count,
+                                      now=now)
+        self.last_crawled_on = now
+        self.next_crawl_on = now + interval
+        self.save(update_fields=['last_crawled_on', 'next_crawl_on', 'crawl_error_count'])
+        _LOG.info('feed:[%s] - next crawl in %s', self, interval)
+
+    @classmethod
+    def get_due_feeds(cls, now=None):
+        now = now or timezone.now()
+        return cls.objects.filter(is_archive=False)\
+                          .filter(Q(next_crawl_on__isnull=True) | Q(next_crawl_on__lte=now))
+
+    @classmethod
+    def lease_due_feeds(cls, now=None):
+        """
+        claims the due feeds so that overlapping runs don't crawl them too. the
+        lease ends when schedule_next_crawl() sets the real next crawl time
+        """
+        now = now or timezone.now()
+        with transaction.atomic():
+            feeds = list(cls.get_due_feeds(now).select_for_update(skip_locked=True))
+            cls.objects.filter(pk__in=[feed.pk for feed in feeds])\
+                       .update(next_crawl_on=now + timedelta(minutes=settings.FEED_CRAWL_LEASE))
+        return feeds
+
+    def extend_lease(self):
+        self.next_crawl_on = timezone.now() + timedelta(minutes=settings.FEED_CRAWL_LEASE)
+        self.save(update_fields=['next_crawl_on'])
+
+    @classmethod
+    def crawl_due_feeds_async(cls):
+        now = timezone.now()
+        feeds = cls.lease_due_feeds(now)
+        for feed in feeds:
+            feed.crawl_feed_async(queued_on=now)
+        return feeds
+
 
 class Article(BaseModel, NewsIndexable):
     INDEX_SOURCE_FIELD = 'feed.source.name'
@@ -95,6 +206,14 @@ class Article(BaseModel, NewsIndexable):
     INDEX_BODY_FIELD = 'body'
     INDEX_PUBLISHED_ON_FIELD = 'published_on'
     INDEX_URL_FIELD = 'url'
+    INDEX_FIELD_LOOKUPS = {
+        'source': 'feed__source__name',
+        'title': 'title',
+        'body': 'body',
+        'published_on': 'published_on',
+        'url': 'url',
+    }
+    INDEX_STATIC_FIELDS = {'source_type': 'article'}
     BULK_FETCH_CHUNK_SIZE = 2000
 
     feed = models.ForeignKey(Feed, on_delete=models.CASCADE)
@@ -107,6 +226,11 @@ class Article(BaseModel, NewsIndexable):
     metadata = JSONField()
     is_pushed_to_index = models.BooleanField(default=False)
 
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(fields=['id'], name='news_article_unpushed_idx', condition=Q(is_pushed_to_index=False)),
+        ]
+
     def __str__(self):
         return '%s:%s' % (self.feed, self.title)
 
@@ -114,12 +238,28 @@ class Article(BaseModel, NewsIndexable):
     def source_type(self):
         return 'article'
 
-    def save(self, *args, **kwargs):
-        if self.feed.source == 'Google News India':
-            parsed = urlparse.urlparse(self.url)
+    @staticmethod
+    def clean_url(url, feed):
+        if feed.source.name == 'Google News India':
+            parsed = urlparse.urlparse(url)
             if parsed.netloc == 'news.google.com':
-                self.url = urlparse.parse_qs(parsed.query)['url'][0]
+                url = urlparse.parse_qs(parsed.query).get('url', [url])[0]
+        return normalize_url(url)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Article, cls).from_db(db, field_names, values)
+        instance._loaded_url = instance.__dict__.get('url')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # only new or changed urls are normalized - an older row's normalized url
+        # may already belong to another row
+        url_changed = 'url' in self.__dict__ and self.url != getattr(self, '_loaded_url', None)
+        if self._state.adding or url_changed:
+            self.url = self.clean_url(self.url, self.feed)
         super(Article, self).save(*args, **kwargs)
+        self._loaded_url = self.url
 
     def process(self):
         from mnemonic.news.utils.article_utils import get_body_from_article
@@ -143,10 +283,72 @@ class Article(BaseModel, NewsIndexable):
                                           queue=settings.CELERY_TASK_QUEUE_PROCESS_ARTICLE,
                                           routing_key=settings.CELERY_TASK_ROUTING_KEY_PROCESS_ARTICLE)
 
+    @classmethod
+    def fetch_many(cls, articles):
+        # takes (pk, url) pairs so that the fetch stage never touches the db
+        from mnemonic.news.utils.article_utils import get_htmls
+
+        htmls = get_htmls([url for pk, url in articles])
+        _LOG.info('fetched [%s/%s] article(s)', sum(html is not None for html in htmls), len(articles))
+        return [pk for (pk, url), html in zip(articles, htmls) if html is not None]
+
+    @classmethod
+    def extract_many(cls, article_ids):
+        from mnemonic.news.utils.article_utils import get_bodies_from_htmls
+        from mnemonic.news.utils.cache_utils import DownloadCache
+
+        articles = list(cls.objects.filter(pk__in=article_ids, body__isnull=True).only('pk', 'url'))
+        if not articles:
+            return
+
+        urls = [a.url for a in articles]
+        htmls = [DownloadCache(url).get(cache_only=True) for url in urls]
+        bodies = get_bodies_from_htmls(urls, htmls)
+        now = timezone.now()
+        processed = []
+        for a, body in zip(articles, bodies):
+            if body is not None:
+                a.body = body
+                a.updated_on = now
+                processed.append(a)
+        cls.objects.bulk_update(processed, ['body', 'updated_on'])
+        _LOG.info('extracted [%s/%s] article(s)', len(processed), len(articles))
+
+    @classmethod
+    def process_many(cls, article_ids):
+        articles = cls.objects.filter(pk__in=article_ids, body__isnull=True).values_list('pk', 'url')
+        cls.extract_many(cls.fetch_many(list(articles)))
+
+    @classmethod
+    def _apply_async_bulk(cls, task, kwarg_name, items, queue, routing_key):
+        from mnemonic.core.celery import app as celery_app
+        from mnemonic.news.utils.iter_utils import chunkify
+
+        with celery_app.producer_or_acquire() as producer:
+            for chunk in chunkify(items, settings.ARTICLE_PROCESS_BATCH_SIZE):
+                task.apply_async(kwargs={kwarg_name: list(chunk)},
+                                 queue=queue,
+                                 routing_key=routing_key,
+                                 producer=producer)
+
+    @classmethod
+    def process_async_bulk(cls, articles):
+        from mnemonic.news.tasks import fetch_articles_async
+        cls._apply_async_bulk(fetch_articles_async, 'articles', articles,
+                              queue=settings.CELERY_TASK_QUEUE_FETCH_ARTICLE,
+                              routing_key=settings.CELERY_TASK_ROUTING_KEY_FETCH_ARTICLE)
+
+    @classmethod
+    def extract_async_bulk(cls, article_ids):
+        from mnemonic.news.tasks import extract_articles_async
+        cls._apply_async_bulk(extract_articles_async, 'article_ids', article_ids,
+                              queue=settings.CELERY_TASK_QUEUE_EXTRACT_ARTICLE,
+                              routing_key=settings.CELERY_TASK_ROUTING_KEY_EXTRACT_ARTICLE)
+
     @classmethod
     def get_bulk_index_qs(cls):
         return super(Article, cls).get_bulk_index_qs()\
-                                  .select_related('feed')
+                                  .select_related('feed__source')
 
 
 class TwitterJob(models.Model, NewsIndexable):
@@ -174,71 +376,150 @@ class TwitterJob(models.Model, NewsIndexable):
         defaults.update(self.config)
         return defaults
 
-    def get_bulk_index_data_for_self(self):
-        for tweet in self.crawl_buffer.get_data():
-            if isinstance(tweet.datetime, int):
-                published_on = datetime.fromtimestamp(tweet.datetime / 1000, pytz.utc)
-            else:
-                published_on = datetime.strptime(tweet.datetime, '%Y-%m-%d %H:%M:%S %Z')
-            non_metadata_keys = {'id', 'id_str', 'tweet', 'datetime', 'datestamp', 'timestamp'}
-            metadata = {k: v for k, v in vars(tweet).items() if k not in non_metadata_keys}
-            mentions = metadata.get('reply_to', []) + metadata.get('mentions', [])
-            yield {
-                '_id': 'tweet.%s' % tweet.id,
-                'source': tweet.username,
-                'source_type': 'tweet',
-                'mentions': [d.get('screen_name') for d in mentions if d.get('screen_name')],
-                'title': tweet.tweet,
-                'published_on': published_on,
-                'url': metadata.get('link'),
-            }
-
     @classmethod
-    def get_bulk_index_data(cls):
-        qs = cls.objects.filter(is_pushed_to_index=False)
+    def bulk_push_to_index(cls, qs=None, **kwargs):
+        """
+        tweets live in each job's crawl results, not in rows, so the generic
+        NewsIndexable path doesn't apply - every unindexed job is indexed through
+        bulk_push_to_index_for_self() instead. returns the pks of the jobs that
+        weren't fully indexed
+        """
+        if qs is None:
+            qs = cls.objects.filter(is_crawled=True, is_pushed_to_index=False)
+        failed = []
         for tj in tqdm(qs, desc='indexing TwitterJobs'):
-            yield from tj.get_bulk_index_data_for_self()
+            tj.start_indexing()
+            if not tj.is_pushed_to_index:
+                failed.append(tj.pk)
+        return failed
+
+    def get_results_range(self):
+        """
+        the part of the handle's shared results file this job crawled, so that
+        only the blocks that overlap it are read. widened by a day on each side
+        as twint's since/until aren't necessarily in utc
+        """
+        config = self.cleaned_config
+        since = until = None
+        if config['since']:
+            since = datetime.fromisoformat(config['since']) - timedelta(days=1)
+        if config['until']:
+            until = datetime.fromisoformat(config['until']) + timedelta(days=1)
+        return {'since': since, 'until': until}
 
     def bulk_push_to_index_for_self(self):
-        from elasticsearch.helpers import bulk
-        from retry import retry
+        """
+        skips tweets that are already in the index (as per the seen-tweet set) and
+        adds the ones elasticsearch acknowledges to it. returns False if any
+        tweet couldn't be indexed
+        """
+        from elasticsearch.helpers import streaming_bulk
         from mnemonic.news.search_indices import News
+        from mnemonic.news.utils.cache_utils import get_seen_tweet_index
         from mnemonic.news.utils.iter_utils import chunkify
         from mnemonic.news.utils.search_utils import get_connection
+        from mnemonic.news.utils.twitter_utils import get_tweet_index_action
 
         connection = get_connection()
-        data = self.get_bulk_index_data_for_self()
-        objects = (News(**d).to_dict(include_meta=True) for d in data)
-
-        @retry(tries=10, delay=10)
-        def f(chunk):
-            bulk(connection, chunk, chunk_size=self.BULK_INDEX_CHUNK_SIZE, request_timeout=60)
-
-        for chunk in chunkify(objects, self.BULK_INDEX_CHUNK_SIZE):
-            f(chunk)
+        seen_tweets = get_seen_tweet_index()
+        num_skipped = num_acked = num_errors = 0
+        for chunk in chunkify(self.crawl_buffer.get_dicts(**self.get_results_range()), self.BULK_INDEX_CHUNK_SIZE):
+            chunk = list(chunk)
+            seen = seen_tweets.contains_many(str(d['id']) for d in chunk)
+            actions = {}
+            for d in chunk:
+                tweet_id = str(d['id'])
+                if tweet_id not in seen and tweet_id not in actions:
+                    actions[tweet_id] = get_tweet_index_action(d)
+            num_skipped += len(chunk) - len(actions)
+
+            acked = []
+            for ok, item in streaming_bulk(connection, News.get_write_actions(actions.values()),
+                                           chunk_size=settings.INDEX_BULK_CHUNK_SIZE,
+                                           max_chunk_bytes=settings.INDEX_BULK_MAX_CHUNK_BYTES,
+                                           max_retries=5,
+                                           raise_on_error=False,
+                                           request_timeout=settings.INDEX_BULK_REQUEST_TIMEOUT):
+                op_type, info = item.popitem()
+                if ok:
+                    acked.append(info['_id'][len('tweet.'):])
+                else:
+                    num_errors += 1
+                    _LOG.warning('%s - error indexing doc:[%s] - %s', self, info.get('_id'), info.get('error'))
+            seen_tweets.add_many(acked)
+            num_acked += len(acked)
+        _LOG.info('%s - indexed:%s skipped:%s errors:%s', self, num_acked, num_skipped, num_errors)
+        return num_errors == 0
 
     @property
     def crawl_buffer(self):
         from mnemonic.news.utils.twitter_utils import CrawlBuffer
         return CrawlBuffer(**self.cleaned_config)
 
+    def record_crawl_state(self, crawl_buffer, started_on):
+        """
+        twint pages from until back towards since and can stop early (limit,
+        errors, rate limits), so only the days down to the oldest tweet it
+        returned are known to be crawled. the day of that tweet is only
+        complete if it is the day of since. a crawl that finished without any
+        tweets covered the whole window - otherwise quiet handles would be
+        crawled from the same since forever
+        """
+        config = self.cleaned_config
+        since = date.fromisoformat(config['since'] or settings.TWITTER_CRAWL_START_DATE)
+        until = date.fromisoformat(config['until']) if config['until'] else started_on
+        if crawl_buffer.min_datetime is not None:
+            oldest = crawl_buffer.min_datetime.date()
+            if oldest > since:
+                since = oldest + timedelta(days=1)
+        elif not crawl_buffer.is_finished:
+            since = until
+        crawled_range = (since, until) if since < until else None
+        TwitterCrawlState.record_crawl(config['username'], config['mentions'],
+                                       max_tweet_id=crawl_buffer.max_tweet_id,
+                                       max_datetime=crawl_buffer.max_datetime,
+                                       crawled_range=crawled_range)
+
     def start_crawl(self):
         if self.is_crawled:
             _LOG.info('%s is already crawled', self)
         else:
             _LOG.info('starting twitter crawl for %s', self)
-            self.crawl_buffer.start_crawl()
+            started_on = timezone.now().date()
+            crawl_buffer = self.crawl_buffer
+            crawl_buffer.start_crawl()
+            crawl_buffer.close()
             self.is_crawled = True
             self.save(update_fields=['is_crawled'])
+            if not self.cleaned_config['only_cached']:
+                self.record_crawl_state(crawl_buffer, started_on)
 
     def start_indexing(self):
+        # bulk load mode is entered once around all the jobs (see index_tweets), not per job
         if self.is_pushed_to_index:
             _LOG.info('%s is already indexed', self)
         else:
             _LOG.info('indexing %s', self)
-            self.bulk_push_to_index_for_self()
-            self.is_pushed_to_index = True
-            self.save(update_fields=['is_pushed_to_index'])
+            is_ok = self.bulk_push_to_index_for_self()
+            if is_ok:
+                self.is_pushed_to_index = True
+                self.save(update_fields=['is_pushed_to_index'])
+
+    @classmethod
+    def index_many(cls, twitter_job_ids, workers=None):
+        """
+        indexes the results of several jobs concurrently, one process per job
+        """
+        from multiprocessing import Pool
+        from django.db import connections
+        from mnemonic.news.utils.search_utils import reset_connection
+        from mnemonic.news.utils.twitter_utils import index_twitter_job
+
+        # workers are forked and mustn't share the parent's db or elasticsearch connections
+        connections.close_all()
+        with Pool(workers, initializer=reset_connection) as pool:
+            for _ in pool.imap_unordered(index_twitter_job, twitter_job_ids):
+                pass
 
     @classmethod
     def create(cls, entity, **config):
@@ -249,10 +530,170 @@ class TwitterJob(models.Model, NewsIndexable):
         if config.get('until'):
             config['until'] = config['until'].strftime('%Y-%m-%d')
 
-        tj, _ = cls.objects.get_or_create(
-            content_type=ct,
-            object_id=object_id,
-            config=config
-        )
+        qs = cls.objects.filter(content_type=ct, object_id=object_id, config=config)
+        if not config.get('until'):
+            # an open ended window grows every day, so a job that has crawled it is stale
+            qs = qs.filter(is_crawled=False)
+        tj = qs.first() or cls.objects.create(content_type=ct, object_id=object_id, config=config)
         tj.start_crawl()
         # tj.start_indexing()
+
+
+class TwitterCrawlState(BaseModel):
+    """
+    how far the timeline (or mentions) of a handle has been crawled - the newest
+    tweet seen so far and the [since, until) date ranges that have been fully
+    crawled, kept sorted and merged
+    """
+    handle = models.CharField(max_length=256)
+    mentions = models.BooleanField(default=False)
+    max_tweet_id = models.BigIntegerField(null=True, blank=True)
+    max_datetime = models.DateTimeField(null=True, blank=True)
+    crawled_ranges = JSONField(default=list, blank=True)
+
+    class Meta:
+        unique_together = ('handle', 'mentions')
+
+    def __str__(self):
+        return '<TwitterCrawlState:%s%s - %s>' % ('@' if self.mentions else '', self.handle, self.max_datetime)
+
+    @classmethod
+    def get_for(cls, handle, mentions):
+        return cls.objects.filter(handle=handle, mentions=bool(mentions)).first() or \
+               cls(handle=handle, mentions=bool(mentions))
+
+    def get_ranges(self):
+        return [(date.fromisoformat(since), date.fromisoformat(until)) for since, until in self.crawled_ranges]
+
+    def add_range(self, since, until):
+        merged = []
+        for r_since, r_until in sorted(self.get_ranges() + [(since, until)]):
+            if merged and r_since <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], r_until)
+            else:
+                merged.append([r_since, r_until])
+        self.crawled_ranges = [[r_since.isoformat(), r_until.isoformat()] for r_since, r_until in merged]
+
+    def get_gaps(self, since, until):
+        """
+        the parts of [since, until) that haven't been crawled yet
+        """
+        gaps = []
+        start = since
+        for r_since, r_until in self.get_ranges():
+            if r_until <= start:
+                continue
+            if r_since >= until:
+                break
+            if r_since > start:
+                gaps.append((start, r_since))
+            start = max(start, r_until)
+        if start < until:
+            gaps.append((start, until))
+        return gaps
+
+    def get_incremental_since(self):
+        if self.max_datetime is None:
+            return
+        return (self.max_datetime - timedelta(hours=settings.TWITTER_CRAWL_OVERLAP_HOURS)).date()
+
+    @classmethod
+    def record_crawl(cls, handle, mentions, max_tweet_id=None, max_datetime=None, crawled_range=None):
+        with transaction.atomic():
+            state, _ = cls.objects.select_for_update().get_or_create(handle=handle, mentions=bool(mentions))
+            if max_tweet_id is not None and (state.max_tweet_id is None or max_tweet_id > state.max_tweet_id):
+                state.max_tweet_id = max_tweet_id
+            if max_datetime is not None and (state.max_datetime is None or max_datetime > state.max_datetime):
+                state.max_datetime = max_datetime
+            if crawled_range is not None:
+                state.add_range(*crawled_range)
+            state.save()
+
+
+class IndexingError(BaseModel):
+    """
+    documents elasticsearch rejected during bulk indexing. they are skipped by
+    later bulk runs until the error is cleared
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    entity = GenericForeignKey('content_type', 'object_id')
+    status = models.CharField(max_length=16)
+    error = models.TextField()
+
+    class Meta:
+        unique_together = ('content_type', 'object_id')
+
+    def __str__(self):
+        return '<IndexingError:%s - %s>' % (self.entity, self.status)
+
+
+class IndexOutbox(models.Model):
+    """
+    documents that have to be (re)indexed or deleted. rows are written by
+    postgres triggers whenever an indexed field of an article changes or an
+    article is deleted (see migrations 0022 and 0025) and are removed once
+    elasticsearch has acknowledged the change
+    """
+    id = models.BigAutoField(primary_key=True)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    is_delete = models.BooleanField(default=False)
+    # deleted rows can't be looked up for the partition their document is in
+    published_on = models.DateField(blank=True, null=True)
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return '<IndexOutbox:%s:%s>' % (self.content_type_id, self.object_id)
+
+    @classmethod
+    def drain(cls, batch_size=None):
+        """
+        indexes one batch from the outbox and returns the number of rows removed.
+        the rows and their documents are read in one transaction that is committed
+        before anything is sent to elasticsearch, and the rows are deleted in a
+        second short one. SKIP LOCKED only keeps concurrent indexers apart while
+        they read, so a document can get indexed twice - which is harmless
+        """
+        from django.db import transaction
+        from mnemonic.news.search_indices import News
+        from mnemonic.news.utils.search_utils import bulk_delete
+
+        batch_size = batch_size or settings.INDEX_OUTBOX_BATCH_SIZE
+        with transaction.atomic():
+            rows = list(cls.objects.select_for_update(skip_locked=True)
+                                   .order_by('id')
+                                   .values_list('id', 'content_type_id', 'object_id', 'is_delete', 'published_on')
+                                   [:batch_size])
+            if not rows:
+                return 0
+
+            by_model = defaultdict(set)
+            deletes = {}
+            for row_id, content_type_id, object_id, is_delete, published_on in rows:
+                if is_delete:
+                    ct = ContentType.objects.get_for_id(content_type_id)
+                    _id = '%s.%s:%s' % (ct.app_label, ct.model, object_id)
+                    deletes[_id] = (content_type_id, object_id, News.get_write_index_names(published_on))
+                else:
+                    by_model[content_type_id].add(object_id)
+            batches = []
+            for content_type_id, object_ids in by_model.items():
+                model = ContentType.objects.get_for_id(content_type_id).model_class()
+                actions = list(model.get_bulk_actions(qs=model.objects.filter(pk__in=object_ids)))
+                batches.append((content_type_id, model, actions))
+
+        retry = set()
+        for content_type_id, model, actions in batches:
+            failed = model.bulk_push_to_index(actions=actions)
+            retry.update((content_type_id, int(pk), False) for pk in failed)
+        if deletes:
+            failed = bulk_delete([(index, _id) for _id, (content_type_id, object_id, indices) in deletes.items()
+                                  for index in indices])
+            retry.update(deletes[_id][:2] + (True,) for _id in set(failed))
+        done = [row_id for row_id, content_type_id, object_id, is_delete, published_on in rows
+                if (content_type_id, object_id, is_delete) not in retry]
+        with transaction.atomic():
+            cls.objects.filter(id__in=done).delete()
+        _LOG.info('drained [%s/%s] outbox row(s)', len(done), len(rows))
+        return len(done)
@@ -1,3 +1,10 @@
+from datetime import date
+import json
+import logging
+import re
+import time
+
+from dateutil.parser import parse as parse_date
 from tqdm import tqdm
 from django.conf import settings
 from django.core.validators import EMPTY_VALUES
@@ -8,6 +15,11 @@ from retry import retry
 
 from mnemonic.news.utils.string_utils import get
 
+_LOG = logging.getLogger(__name__)
+_TEMPLATES_INSTALLED = set()
+_READ_VERSION = {'version': None, 'expires_on': 0}
+INDEX_VERSION_RE = re.compile(r'^%s-v(\d+)-' % re.escape(settings.NEWS_INDEX_PREFIX))
+
 connections.create_connection(hosts=settings.ELASTICSEARCH_HOSTS)
 article_analyzer = analyzer('article_analyzer',
     tokenizer=tokenizer('article_tokenizer', "uax_url_email", max_token_length=2048),
@@ -24,11 +36,161 @@ class News(Document):
     url = Keyword(ignore_above=2048)
 
     class Index:
-        name = 'news'
+        # documents live in one index per time partition and are read through
+        # this alias. see get_index_name()
+        name = settings.NEWS_INDEX_READ_ALIAS
 
     class Meta:
         doc_type = '_doc'
 
+    @classmethod
+    def get_index_prefix(cls, version=None):
+        return '%s-v%s' % (settings.NEWS_INDEX_PREFIX, version or settings.NEWS_INDEX_VERSION)
+
+    @classmethod
+    def get_index_name(cls, published_on=None, version=None):
+        prefix = cls.get_index_prefix(version)
+        if published_on in EMPTY_VALUES:
+            return '%s-undated' % prefix
+        if isinstance(published_on, str):
+            published_on = parse_date(published_on)
+        if settings.NEWS_INDEX_PARTITION == 'year':
+            return '%s-%04d' % (prefix, published_on.year)
+        else:
+            return '%s-%04d-%02d' % (prefix, published_on.year, published_on.month)
+
+    @staticmethod
+    def get_index_version(index):
+        match = INDEX_VERSION_RE.match(index)
+        if match:
+            return int(match.group(1))
+
+    @classmethod
+    def get_read_version(cls):
+        """
+        the version the read alias points at. it lags NEWS_INDEX_VERSION while
+        reindex_search_indices builds a new version and is None when the alias
+        doesn't point at the partitions of exactly one version. looked up again
+        every NEWS_INDEX_ALIAS_CACHE_SECONDS so that processes notice the swap
+        """
+        from elasticsearch import NotFoundError
+        from mnemonic.news.utils.search_utils import get_connection
+
+        if time.time() >= _READ_VERSION['expires_on']:
+            try:
+                indices = get_connection().indices.get_alias(name=settings.NEWS_INDEX_READ_ALIAS)
+            except NotFoundError:
+                indices = {}
+            versions = set(cls.get_index_version(index) for index in indices)
+            _READ_VERSION['version'] = versions.pop() if len(versions) == 1 else None
+            _READ_VERSION['expires_on'] = time.time() + settings.NEWS_INDEX_ALIAS_CACHE_SECONDS
+        return _READ_VERSION['version']
+
+    @classmethod
+    def get_write_versions(cls):
+        """
+        writes go to the current version and, until a reindex into it has been
+        swapped in, also to the version that searches are served from
+        """
+        versions = [settings.NEWS_INDEX_VERSION]
+        read_version = cls.get_read_version()
+        if read_version is not None and read_version != settings.NEWS_INDEX_VERSION:
+            versions.append(read_version)
+        return versions
+
+    @classmethod
+    def get_write_index_names(cls, published_on=None):
+        cls.ensure_template()
+        return [cls.get_index_name(published_on, version) for version in cls.get_write_versions()]
+
+    @classmethod
+    def get_write_actions(cls, actions):
+        """
+        bulk actions built for the current version, plus a copy of each for the
+        other write versions
+        """
+        cls.ensure_template()
+        prefix = cls.get_index_prefix()
+        other_prefixes = [cls.get_index_prefix(version) for version in cls.get_write_versions()[1:]]
+
+        def g():
+            for action in actions:
+                yield action
+                for other_prefix in other_prefixes:
+                    yield dict(action, _index=other_prefix + action['_index'][len(prefix):])
+
+        return g()
+
+    @classmethod
+    def get_index_names(cls, start=None, end=None):
+        """
+        the partitions that hold documents published between start and end, in the
+        version the read alias points at. falls back to the alias when the range is
+        open ended or spans too many partitions. callers search with ignore_unavailable
+        so an empty range gets a partition that never exists - an empty list would
+        search every index in the cluster
+        """
+        version = cls.get_read_version()
+        if start is None or version is None:
+            return [settings.NEWS_INDEX_READ_ALIAS]
+        end = end or date.today()
+        if start > end:
+            return ['%s-none' % cls.get_index_prefix(version)]
+        names = []
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            name = cls.get_index_name(date(year, month, 1), version)
+            if not names or names[-1] != name:
+                names.append(name)
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        if len(names) > settings.NEWS_INDEX_MAX_SEARCH_PARTITIONS:
+            return [settings.NEWS_INDEX_READ_ALIAS]
+        return names
+
+    @classmethod
+    def init_template(cls, version=None, with_alias=None, using=None):
+        """
+        partitions are created on first write from this template, which also adds
+        them to the read alias. by default the alias is only added if it doesn't
+        exist yet or already points at this version - a new version is attached
+        to the alias by reindex_search_indices once it is fully built
+        """
+        from mnemonic.news.utils.search_utils import get_connection
+
+        alias = settings.NEWS_INDEX_READ_ALIAS
+        pattern = cls.get_index_prefix(version) + '-*'
+        if with_alias is None:
+            es = get_connection()
+            with_alias = not es.indices.exists(index=alias) or es.indices.exists_alias(name=alias, index=pattern)
+        index = cls._index.clone(name=pattern)
+        if with_alias:
+            index.aliases(**{alias: {}})
+        index.as_template(cls.get_index_prefix(version), pattern=pattern).save(using=using)
+
+    @classmethod
+    def ensure_template(cls):
+        """
+        partitions that are written to before their template exists get dynamic
+        mappings without article_analyzer. create_search_indices installs the
+        template on deploy - this covers writers that get there first. only
+        writers call this so that searches never touch templates
+        """
+        from mnemonic.news.utils.search_utils import get_connection
+
+        prefix = cls.get_index_prefix()
+        if prefix in _TEMPLATES_INSTALLED:
+            return
+        if not get_connection().indices.exists_template(name=prefix):
+            _LOG.info('installing the missing template for [%s]', prefix)
+            cls.init_template()
+        _TEMPLATES_INSTALLED.add(prefix)
+
+    @classmethod
+    def get_bulk_action(cls, d):
+        action = cls(**d).to_dict(include_meta=True)
+        action['_index'] = cls.get_index_name(d.get('published_on'))
+        return action
+
 
 class NewsIndexable(object):
     INDEX_SOURCE_FIELD = None
@@ -38,6 +200,10 @@ class NewsIndexable(object):
     INDEX_BODY_FIELD = None
     INDEX_PUBLISHED_ON_FIELD = None
     INDEX_URL_FIELD = None
+    # index field -> ORM lookup. lets bulk indexing build documents from a single
+    # values() query instead of model instances
+    INDEX_FIELD_LOOKUPS = None
+    INDEX_STATIC_FIELDS = None
 
     BULK_FETCH_CHUNK_SIZE = 10 * 1000
     BULK_INDEX_CHUNK_SIZE = 10 * 1000
@@ -60,43 +226,141 @@ class NewsIndexable(object):
     def push_to_index(self):
 
         @retry(tries=10, delay=1, backoff=2)
-        def f(obj):
-            obj.save()
+        def f(obj, index):
+            return obj.save(index=index)
 
-        news = News(meta=self.get_index_meta_data(), **self.get_index_data())
-        f(news)
+        from mnemonic.news.utils.search_utils import delete_stale_copies
+
+        data = self.get_index_data()
+        news = News(meta=self.get_index_meta_data(), **data)
+        for index in News.get_write_index_names(data.get('published_on')):
+            if f(news, index=index) == 'created':
+                delete_stale_copies([(index, news.meta.id)])
 
     @classmethod
     def get_bulk_index_qs(cls):
-        return cls.objects.filter(is_pushed_to_index=False)
+        from django.contrib.contenttypes.models import ContentType
+        from mnemonic.news.models import IndexingError
+
+        failed = IndexingError.objects.filter(content_type=ContentType.objects.get_for_model(cls))
+        return cls.objects.filter(is_pushed_to_index=False)\
+                          .exclude(pk__in=failed.values('object_id'))
 
     @classmethod
-    def get_bulk_index_data(cls):
+    def get_bulk_index_data(cls, qs=None):
         from django.db import models
         from mnemonic.news.utils.queryset_utils import queryset_iterator
 
         if issubclass(cls, models.Model):
-            qs = queryset_iterator(cls.get_bulk_index_qs(), chunksize=cls.BULK_FETCH_CHUNK_SIZE)
+            if qs is None:
+                qs = cls.get_bulk_index_qs()
+            qs = queryset_iterator(qs, chunksize=cls.BULK_FETCH_CHUNK_SIZE)
             return (dict(_id=obj.get_uid(), **obj.get_index_data()) for obj in qs)
         else:
             raise NotImplementedError
 
     @classmethod
-    def bulk_push_to_index(cls):
-        from elasticsearch.helpers import bulk
-        from mnemonic.news.utils.iter_utils import chunkify
-        from mnemonic.news.utils.search_utils import get_connection
+    def get_bulk_index_actions(cls, qs=None):
+        """
+        bulk actions built straight from INDEX_FIELD_LOOKUPS - related fields are
+        fetched with joins and no model instances or documents are created
+        """
+        from mnemonic.news.utils.queryset_utils import queryset_iterator
 
-        connection = get_connection()
-        data = cls.get_bulk_index_data()
-        objects = (News(**d).to_dict(include_meta=True) for d in data)
-
-        @retry(tries=10, delay=10)
-        def f(chunk):
-            chunk = list(chunk)
-            bulk(connection, chunk, chunk_size=cls.BULK_INDEX_CHUNK_SIZE, request_timeout=60)
-            pks = [d['_id'].split(':')[1] for d in chunk]
+        lookups = cls.INDEX_FIELD_LOOKUPS
+        static_fields = cls.INDEX_STATIC_FIELDS or {}
+        uid_prefix = '%s.%s:' % (cls._meta.app_label, cls._meta.model_name)
+        if qs is None:
+            qs = cls.get_bulk_index_qs()
+        qs = qs.values_list('pk', *lookups.values())
+        for row in queryset_iterator(qs, chunksize=cls.BULK_FETCH_CHUNK_SIZE):
+            source = dict(static_fields)
+            for field, value in zip(lookups, row[1:]):
+                if value not in EMPTY_VALUES:
+                    source[field] = value
+            yield {'_index': News.get_index_name(source.get('published_on')),
+                   '_id': uid_prefix + str(row[0]),
+                   '_source': source}
+
+    @classmethod
+    def _mark_pushed_to_index(cls, pks):
+        if pks:
             cls.objects.filter(pk__in=pks).update(is_pushed_to_index=True)
 
-        for chunk in tqdm(chunkify(objects, cls.BULK_INDEX_CHUNK_SIZE)):
-            f(chunk)
+    @classmethod
+    def _record_indexing_error(cls, pk, info):
+        from django.contrib.contenttypes.models import ContentType
+        from mnemonic.news.models import IndexingError
+
+        error = info.get('error')
+        IndexingError.objects.update_or_create(content_type=ContentType.objects.get_for_model(cls),
+                                               object_id=pk,
+                                               defaults={'status': str(info.get('status')),
+                                                         'error': json.dumps(error) if isinstance(error, dict) else str(error)})
+
+    @staticmethod
+    def _is_retryable(status):
+        # transport errors have no status code
+        return not isinstance(status, int) or status == 429 or status >= 500
+
+    @classmethod
+    def get_bulk_actions(cls, qs=None):
+        if cls.INDEX_FIELD_LOOKUPS:
+            return cls.get_bulk_index_actions(qs)
+        else:
+            return (News.get_bulk_action(d) for d in cls.get_bulk_index_data(qs))
+
+    @classmethod
+    def bulk_push_to_index(cls, thread_count=None, chunk_size=None, max_chunk_bytes=None, qs=None, actions=None):
+        """
+        sends documents over several concurrent bulk requests. only documents that
+        elasticsearch acknowledged are marked as pushed - rejected documents are
+        recorded as IndexingErrors and documents that hit transient errors are left
+        for the next run. returns the pks of the latter.
+        parallel_bulk pulls actions from its own thread (and so its own db
+        connection) - callers inside a transaction have to pass actions already built
+        """
+        from elasticsearch.helpers import parallel_bulk
+        from mnemonic.news.utils.search_utils import delete_stale_copies, get_connection
+
+        thread_count = thread_count or settings.INDEX_BULK_THREAD_COUNT
+        chunk_size = chunk_size or settings.INDEX_BULK_CHUNK_SIZE
+        connection = get_connection()
+        if actions is None:
+            actions = cls.get_bulk_actions(qs)
+        actions = News.get_write_actions(actions)
+
+        results = parallel_bulk(connection, actions,
+                                thread_count=thread_count,
+                                queue_size=thread_count,
+                                chunk_size=chunk_size,
+                                max_chunk_bytes=max_chunk_bytes or settings.INDEX_BULK_MAX_CHUNK_BYTES,
+                                raise_on_error=False,
+                                raise_on_exception=False,
+                                request_timeout=settings.INDEX_BULK_REQUEST_TIMEOUT)
+        acked = []
+        failed = []
+        created = []
+        num_acked = num_rejected = 0
+        for ok, item in tqdm(results, desc='indexing %s' % cls.__name__):
+            op_type, info = item.popitem()
+            pk = info['_id'].split(':')[1]
+            if ok:
+                acked.append(pk)
+                num_acked += 1
+                if info.get('result') == 'created':
+                    created.append((info['_index'], info['_id']))
+                if len(acked) >= chunk_size:
+                    cls._mark_pushed_to_index(acked)
+                    delete_stale_copies(created)
+                    acked = []
+                    created = []
+            elif cls._is_retryable(info.get('status')):
+                failed.append(pk)
+            else:
+                cls._record_indexing_error(pk, info)
+                num_rejected += 1
+        cls._mark_pushed_to_index(acked)
+        delete_stale_copies(created)
+        _LOG.info('indexed %s - acked:%s rejected:%s failed:%s', cls.__name__, num_acked, num_rejected, len(failed))
+        return failed
@@ -1,11 +1,21 @@
+import logging
+
 from mnemonic.core.celery import app as celery_app
 
+_LOG = logging.getLogger(__name__)
+
 
 @celery_app.task(ignore_result=True)
-def crawl_feed_async(feed_id):
+def crawl_feed_async(feed_id, queued_on=None):
     from mnemonic.news.models import Feed
 
     feed = Feed.objects.get(pk=feed_id)
+    # the lease can run out while the task waits in a backed up queue and the
+    # feed gets queued again - only the first of those tasks crawls it
+    if queued_on is not None and feed.last_crawled_on is not None and feed.last_crawled_on >= queued_on:
+        _LOG.info('feed:[%s] - already crawled since it was queued', feed)
+        return
+    feed.extend_lease()
     feed.crawl_feed()
 
 
@@ -15,3 +25,26 @@ def process_article_async(article_id):
 
     article = Article.objects.get(pk=article_id)
     article.process()
+
+
+@celery_app.task(ignore_result=True)
+def process_articles_async(article_ids):
+    from mnemonic.news.models import Article
+
+    Article.process_many(article_ids)
+
+
+@celery_app.task(ignore_result=True)
+def fetch_articles_async(articles):
+    from mnemonic.news.models import Article
+
+    article_ids = Article.fetch_many(articles)
+    if article_ids:
+        Article.extract_async_bulk(article_ids)
+
+
+@celery_app.task(ignore_result=True)
+def extract_articles_async(article_ids):
+    from mnemonic.news.models import Article
+
+    Article.extract_many(article_ids)
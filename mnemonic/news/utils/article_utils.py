@@ -1,6 +1,14 @@
-from newspaper import Article as NArticle
+import logging
+from multiprocessing import Pool
 
-from mnemonic.news.utils.cache_utils import DownloadCache
+from newspaper.article import ArticleException
+
+from django.conf import settings
+
+from mnemonic.news.utils.cache_utils import DownloadCache, get_extraction_cache
+from mnemonic.news.utils.extractor_utils import extract
+
+_LOG = logging.getLogger(__name__)
 
 
 def get_body_from_html(url, html, cache=False):
@@ -9,12 +17,65 @@ def get_body_from_html(url, html, cache=False):
         if not dc.is_cached():
             dc.cache(html)
 
-    narticle = NArticle(url, fetch_images=False)
-    narticle.set_html(html)
-    narticle.parse()
-    return narticle.text
+    return extract_from_html(url, html)['text']
+
+
+def extract_from_html(url, html):
+    """
+    returns the body and metadata extracted from html. results are memoized by
+    the content of the html so unchanged pages aren't parsed again
+    """
+    if settings.ARTICLE_EXTRACTION_CACHE_ENABLED:
+        cache = get_extraction_cache()
+        key = cache.get_key(html)
+        result = cache.get(key)
+        if result is not None:
+            return result
+    else:
+        cache = None
+
+    result = extract(url, html)
+    if cache is not None:
+        cache.set(key, result)
+    return result
 
 
 def get_body_from_article(url):
     html = DownloadCache(url).get()
     return get_body_from_html(url, html)
+
+
+def get_htmls(urls):
+    return DownloadCache.get_many(urls)
+
+
+def _get_body(url_and_html):
+    url, html = url_and_html
+    if html is None:
+        return
+    try:
+        return get_body_from_html(url, html)
+    except ArticleException as ex:
+        _LOG.warning('error extracting body from url:[%s] - %s', url, ex)
+
+
+def get_bodies_from_htmls(urls, htmls, workers=None):
+    workers = workers or settings.ARTICLE_EXTRACT_WORKERS
+    items = list(zip(urls, htmls))
+    if workers > 1:
+        with Pool(workers) as pool:
+            return pool.map(_get_body, items)
+    else:
+        return list(map(_get_body, items))
+
+
+def get_body_from_cache(url):
+    """
+    extracts the body from the cached copy of url without going to the network.
+    returns None if the page isn't cached or can't be extracted
+    """
+    try:
+        html = DownloadCache(url).get(cache_only=True)
+        return _get_body((url, html))
+    except Exception as ex:
+        _LOG.warning('error extracting body from url:[%s] - %s', url, ex)
@@ -0,0 +1,228 @@
+from collections import namedtuple
+import logging
+import os
+import struct
+
+import zstandard
+
+from mnemonic.news.utils.frame_utils import (FrameError, HEADER as FRAME_HEADER, MAGIC as FRAME_MAGIC,
+                                              RESYNC_CHUNK_SIZE, decode_frame, encode_frame)
+
+_LOG = logging.getLogger(__name__)
+MAGIC = b'MNB2'
+# magic, count, min_ts, max_ts, min_id, max_id, length of the frame that follows
+HEADER = struct.Struct('<4sIqqQQI')
+# offset of the block followed by its header fields
+INDEX_ENTRY = struct.Struct('<QIqqQQI')
+
+BlockHeader = namedtuple('BlockHeader', ['offset', 'count', 'min_ts', 'max_ts', 'min_id', 'max_id', 'length'])
+
+
+def get_index_fname(fname):
+    return fname + '.idx'
+
+
+def in_range(ts, _id, since=None, until=None, min_id=None, max_id=None):
+    return ((since is None or ts >= since) and (until is None or ts < until) and
+            (min_id is None or _id >= min_id) and (max_id is None or _id <= max_id))
+
+
+class BlockWriter(object):
+    """
+    appends each batch of records as one block - a header (record count,
+    min/max timestamp, min/max id and length) followed by a checksummed frame
+    (see frame_utils). headers are also appended to a sidecar .idx file so that
+    readers can seek straight to the blocks they need and skip corrupt ones
+    without decoding anything. get_keys(record) returns the (timestamp, id) pair
+    the headers are built from
+    """
+    def __init__(self, fname, get_keys, codec='zstd', level=3):
+        self.fname = fname
+        self.get_keys = get_keys
+        self.codec = codec
+        self.compressor = zstandard.ZstdCompressor(level=level)
+        reader = BlockReader(fname)
+        reader.sync_index()
+        reader.truncate_torn_block()
+        self.file = open(fname, 'ab')
+        self.index_file = open(get_index_fname(fname), 'ab')
+
+    def write(self, records):
+        if not records:
+            return
+        keys = [self.get_keys(record) for record in records]
+        timestamps = [ts for ts, _id in keys]
+        ids = [_id for ts, _id in keys]
+        frame = encode_frame(records, self.codec, self.compressor)
+        fields = (len(records), min(timestamps), max(timestamps), min(ids), max(ids), len(frame))
+
+        offset = self.file.tell()
+        self.file.write(HEADER.pack(MAGIC, *fields))
+        self.file.write(frame)
+        self.file.flush()
+        # the index is only updated once the block is on disk. readers pick up
+        # blocks that are missing from it by scanning headers
+        self.index_file.write(INDEX_ENTRY.pack(offset, *fields))
+        self.index_file.flush()
+
+    def close(self):
+        self.file.close()
+        self.index_file.close()
+
+
+class BlockReader(object):
+    def __init__(self, fname, get_keys=None):
+        self.fname = fname
+        self.get_keys = get_keys
+
+    def read_index(self, size):
+        index_fname = get_index_fname(self.fname)
+        if not os.path.exists(index_fname):
+            return []
+        with open(index_fname, 'rb') as f:
+            data = f.read()
+        # a torn trailing entry is ignored
+        data = data[:len(data) - len(data) % INDEX_ENTRY.size]
+        headers = [BlockHeader(*entry) for entry in INDEX_ENTRY.iter_unpack(data)]
+        if headers and headers[-1].offset + HEADER.size + headers[-1].length > size:
+            _LOG.warning('index for [%s] points past the end of the file - rebuilding it from the block headers',
+                         self.fname)
+            return []
+        return headers
+
+    @staticmethod
+    def read_header(f, offset, size):
+        """
+        the header at offset, if there is one that fits in the file and is
+        followed by the frame it describes
+        """
+        if offset + HEADER.size + FRAME_HEADER.size > size:
+            return
+        f.seek(offset)
+        data = f.read(HEADER.size + FRAME_HEADER.size)
+        magic, *fields = HEADER.unpack_from(data)
+        header = BlockHeader(offset, *fields)
+        if magic != MAGIC or offset + HEADER.size + header.length > size:
+            return
+        frame_magic, codec, length, crc = FRAME_HEADER.unpack_from(data, HEADER.size)
+        if frame_magic != FRAME_MAGIC or FRAME_HEADER.size + length != header.length:
+            return
+        return header
+
+    def find_next_header(self, f, offset, size):
+        pos = offset + 1
+        while pos < size:
+            f.seek(pos)
+            chunk = f.read(RESYNC_CHUNK_SIZE + len(MAGIC) - 1)
+            i = chunk.find(MAGIC)
+            while i >= 0:
+                header = self.read_header(f, pos + i, size)
+                if header is not None:
+                    return header
+                i = chunk.find(MAGIC, i + 1)
+            pos += RESYNC_CHUNK_SIZE
+
+    def scan_headers(self, f, offset, size):
+        """
+        a corrupt header is skipped by scanning for the next valid one, so
+        only a torn tail ends the scan
+        """
+        headers = []
+        while offset < size:
+            header = self.read_header(f, offset, size)
+            if header is None:
+                header = self.find_next_header(f, offset, size)
+                if header is None:
+                    _LOG.warning('torn block in [%s] at offset:%s - ignoring the rest of the file', self.fname, offset)
+                    break
+                _LOG.warning('corrupt block in [%s] at offset:%s - skipping %s byte(s)',
+                             self.fname, offset, header.offset - offset)
+            headers.append(header)
+            offset = header.offset + HEADER.size + header.length
+        return headers
+
+    def _get_headers(self):
+        if not os.path.exists(self.fname):
+            return [], []
+        size = os.path.getsize(self.fname)
+        indexed = self.read_index(size)
+        end = indexed[-1].offset + HEADER.size + indexed[-1].length if indexed else 0
+        scanned = []
+        if end < size:
+            with open(self.fname, 'rb') as f:
+                scanned = self.scan_headers(f, end, size)
+        return indexed, scanned
+
+    def get_headers(self):
+        indexed, scanned = self._get_headers()
+        return indexed + scanned
+
+    def sync_index(self):
+        """
+        makes the index cover every block in the file. writers call this before
+        appending so that a block whose index entry was lost doesn't end up
+        in the middle of the file where readers would never look for it
+        """
+        index_fname = get_index_fname(self.fname)
+        indexed, scanned = self._get_headers()
+        expected_size = len(indexed) * INDEX_ENTRY.size
+        index_size = os.path.getsize(index_fname) if os.path.exists(index_fname) else 0
+        if not scanned and index_size == expected_size:
+            return
+        _LOG.info('adding %s block(s) to the index for [%s]', len(scanned), self.fname)
+        with open(index_fname, 'r+b' if indexed else 'wb') as f:
+            f.seek(expected_size)
+            f.truncate()
+            for header in scanned:
+                f.write(INDEX_ENTRY.pack(*header))
+
+    def truncate_torn_block(self):
+        """
+        drops a torn tail - whatever follows the last valid block - so that
+        blocks appended after it start at a block boundary
+        """
+        if not os.path.exists(self.fname):
+            return
+        headers = self.get_headers()
+        end = headers[-1].offset + HEADER.size + headers[-1].length if headers else 0
+        size = os.path.getsize(self.fname)
+        if size > end:
+            _LOG.warning('truncating %s trailing byte(s) from [%s]', size - end, self.fname)
+            with open(self.fname, 'r+b') as f:
+                f.truncate(end)
+
+    @staticmethod
+    def overlaps(header, since=None, until=None, min_id=None, max_id=None):
+        return ((since is None or header.max_ts >= since) and
+                (until is None or header.min_ts < until) and
+                (min_id is None or header.max_id >= min_id) and
+                (max_id is None or header.min_id <= max_id))
+
+    def iter_blocks(self, since=None, until=None, min_id=None, max_id=None):
+        """
+        yields (header, records) for the blocks that overlap [since, until) and
+        [min_id, max_id]. corrupt blocks are skipped
+        """
+        headers = [header for header in self.get_headers() if self.overlaps(header, since, until, min_id, max_id)]
+        if not headers:
+            return
+        with open(self.fname, 'rb') as f:
+            for header in headers:
+                f.seek(header.offset + HEADER.size)
+                try:
+                    records = decode_frame(f.read(header.length))
+                except FrameError as ex:
+                    _LOG.warning('corrupt block in [%s] at offset:%s - skipping %s record(s) - %s',
+                                 self.fname, header.offset, header.count, ex)
+                    continue
+                yield header, records
+
+    def iter_records(self, since=None, until=None, min_id=None, max_id=None):
+        filtered = any(v is not None for v in (since, until, min_id, max_id))
+        for header, records in self.iter_blocks(since, until, min_id, max_id):
+            if not filtered:
+                yield from records
+                continue
+            for record in records:
+                if in_range(*self.get_keys(record), since, until, min_id, max_id):
+                    yield record
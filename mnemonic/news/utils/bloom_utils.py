@@ -0,0 +1,36 @@
+import hashlib
+import math
+
+from bitarray import bitarray
+
+
+class BloomFilter(object):
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bitarray(self.num_bits)
+        self.bits.setall(False)
+
+    def __str__(self):
+        return '<BloomFilter:%s bits - %s hashes>' % (self.num_bits, self.num_hashes)
+
+    def _get_positions(self, key):
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        digest = hashlib.md5(key).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for position in self._get_positions(key):
+            self.bits[position] = True
+
+    def update(self, keys):
+        for key in keys:
+            self.add(key)
+
+    def __contains__(self, key):
+        return all(self.bits[position] for position in self._get_positions(key))
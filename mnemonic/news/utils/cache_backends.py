@@ -0,0 +1,406 @@
+import fcntl
+import gzip
+import logging
+import mmap
+import os
+import re
+import threading
+import time
+
+import zstandard
+
+from django.conf import settings
+
+from mnemonic.news.utils.class_utils import get_object_from_python_path
+from mnemonic.news.utils.file_utils import ShelveFile, mkdir_p
+from mnemonic.news.utils.msgpack_utils import dumps, loads
+
+_LOG = logging.getLogger(__name__)
+KEY_RE = re.compile('^[0-9a-f]{32}$')
+
+
+class BaseCacheBackend(object):
+    def exists(self, key):
+        raise NotImplementedError
+
+    def read(self, key):
+        raise NotImplementedError
+
+    def write(self, key, html, url=None, fetched_on=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def get_info(self, key):
+        return
+
+    def keys(self):
+        raise NotImplementedError
+
+
+class FileCacheBackend(BaseCacheBackend):
+    """
+    one uncompressed file per entry in a single flat directory
+    """
+    def __init__(self, root=None):
+        self.root = root or settings.ARTICLE_CACHE_DIR
+
+    def get_path(self, key):
+        return os.path.join(self.root, key)
+
+    def exists(self, key):
+        return os.path.exists(self.get_path(key))
+
+    def read(self, key):
+        return open(self.get_path(key)).read()
+
+    def write(self, key, html, url=None, fetched_on=None):
+        mkdir_p(self.root)
+        with ShelveFile(self.get_path(key)) as f:
+            f.write(html)
+        if fetched_on is not None:
+            os.utime(self.get_path(key), (fetched_on, fetched_on))
+
+    def delete(self, key):
+        os.remove(self.get_path(key))
+
+    def get_info(self, key):
+        # entries were written when they were fetched
+        return {'fetched_on': int(os.path.getmtime(self.get_path(key)))}
+
+    def keys(self):
+        for entry in os.scandir(self.root):
+            if KEY_RE.match(entry.name):
+                yield entry.name
+
+
+class ZstdDictionaries(object):
+    """
+    trained dictionaries are stored as <dict_id>.dict. zstd frames record the id
+    of the dictionary they were compressed with so older entries stay readable
+    after a dictionary is retrained
+    """
+    def __init__(self, root=None):
+        self.root = root or settings.ARTICLE_CACHE_ZSTD_DICT_DIR
+        self._dicts = {}
+
+    def get_path(self, dict_id):
+        return os.path.join(self.root, '%s.dict' % dict_id)
+
+    def get(self, dict_id):
+        if dict_id not in self._dicts:
+            with open(self.get_path(dict_id), 'rb') as f:
+                self._dicts[dict_id] = zstandard.ZstdCompressionDict(f.read())
+        return self._dicts[dict_id]
+
+    def get_latest_id(self):
+        if not os.path.isdir(self.root):
+            return
+        paths = [entry.path for entry in os.scandir(self.root) if entry.name.endswith('.dict')]
+        if paths:
+            latest = max(paths, key=os.path.getmtime)
+            return int(os.path.basename(latest).split('.')[0])
+
+    def save(self, zstd_dict):
+        mkdir_p(self.root)
+        with ShelveFile(self.get_path(zstd_dict.dict_id()), mode='wb', temp_dir=self.root) as f:
+            f.write(zstd_dict.as_bytes())
+        self._dicts[zstd_dict.dict_id()] = zstd_dict
+        return zstd_dict.dict_id()
+
+
+class Codecs(object):
+    """
+    compresses with the configured codec and decompresses anything written by
+    either codec. zstd uses the latest trained dictionary if there is one
+    """
+    def __init__(self, codec=None, level=None):
+        self.codec = codec or settings.ARTICLE_CACHE_CODEC
+        self.level = level or settings.ARTICLE_CACHE_COMPRESSION_LEVEL
+        self.dicts = ZstdDictionaries()
+
+        dict_id = settings.ARTICLE_CACHE_ZSTD_DICT_ID or self.dicts.get_latest_id()
+        if dict_id is None:
+            self.compressor = zstandard.ZstdCompressor(level=self.level)
+        else:
+            self.compressor = zstandard.ZstdCompressor(level=self.level, dict_data=self.dicts.get(dict_id))
+
+    def compress(self, data):
+        if self.codec == 'zstd':
+            return self.compressor.compress(data)
+        else:
+            return gzip.compress(data, compresslevel=self.level)
+
+    def decompress(self, data, codec):
+        if codec == 'zstd':
+            dict_id = zstandard.get_frame_parameters(data).dict_id
+            if dict_id:
+                decompressor = zstandard.ZstdDecompressor(dict_data=self.dicts.get(dict_id))
+            else:
+                decompressor = zstandard.ZstdDecompressor()
+            return decompressor.decompress(data)
+        else:
+            return gzip.decompress(data)
+
+
+class ShardedCacheBackend(BaseCacheBackend):
+    """
+    compressed entries in nested hash-prefix directories (ab/cd/abcd...). size and
+    fetch time of every entry is recorded in an LSM index. entries that are only
+    in the legacy flat directory are still served until migrate_article_cache runs
+    """
+    EXTENSIONS = {'zstd': '.zst', 'gzip': '.gz'}
+
+    def __init__(self, root=None, codec=None, shard_depth=2, legacy_root=None, level=None):
+        from mnemonic.news.utils.cache_utils import DiskCacheManager
+
+        self.root = root or settings.ARTICLE_CACHE_SHARDED_DIR
+        self.codec = codec or settings.ARTICLE_CACHE_CODEC
+        self.shard_depth = shard_depth
+        self.level = level or settings.ARTICLE_CACHE_COMPRESSION_LEVEL
+        self.legacy = FileCacheBackend(legacy_root) if settings.ARTICLE_CACHE_LEGACY_FALLBACK else None
+        self.index = DiskCacheManager.get(settings.ARTICLE_CACHE_INDEX)
+        self.codecs = Codecs(self.codec, self.level)
+
+    def get_path(self, key, codec=None):
+        shards = [key[i * 2:i * 2 + 2] for i in range(self.shard_depth)]
+        return os.path.join(self.root, *shards, key + self.EXTENSIONS[codec or self.codec])
+
+    def _find_path(self, key):
+        for codec in self.EXTENSIONS:
+            path = self.get_path(key, codec)
+            if os.path.exists(path):
+                return path, codec
+        return None, None
+
+    def exists(self, key):
+        path, codec = self._find_path(key)
+        return path is not None or (self.legacy is not None and self.legacy.exists(key))
+
+    def read(self, key):
+        path, codec = self._find_path(key)
+        if path is None:
+            if self.legacy is not None:
+                return self.legacy.read(key)
+            raise FileNotFoundError(self.get_path(key))
+        with open(path, 'rb') as f:
+            return self.codecs.decompress(f.read(), codec).decode('utf-8')
+
+    def write(self, key, html, url=None, fetched_on=None):
+        data = html.encode('utf-8')
+        compressed = self.codecs.compress(data)
+        path = self.get_path(key)
+        mkdir_p(os.path.dirname(path))
+        with ShelveFile(path, mode='wb', temp_dir=os.path.dirname(path)) as f:
+            f.write(compressed)
+        self.index[key] = dumps({
+            'url': url,
+            'size': len(data),
+            'compressed_size': len(compressed),
+            'fetched_on': fetched_on or int(time.time()),
+        })
+
+    def delete(self, key):
+        path, codec = self._find_path(key)
+        if path is not None:
+            os.remove(path)
+        try:
+            del self.index[key]
+        except KeyError:
+            pass
+
+    def get_info(self, key):
+        try:
+            return loads(self.index[key])
+        except KeyError:
+            return
+
+    def keys(self):
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            for filename in filenames:
+                key = filename.split('.')[0]
+                if KEY_RE.match(key):
+                    yield key
+
+
+class PackedSegmentCacheBackend(BaseCacheBackend):
+    """
+    compressed entries appended as WARC-like records to numbered segment files.
+    a segment is closed once it grows past ARTICLE_CACHE_SEGMENT_SIZE and is never
+    written to again, so closed segments can be archived as they are. the LSM
+    index maps each key to (segment, offset, length) of its payload and reads
+    go through a memory map of the segment
+    """
+    SEGMENT_RE = re.compile(r'^(\d{8})\.warc$')
+
+    def __init__(self, root=None, codec=None, segment_size=None, legacy_root=None, level=None):
+        from mnemonic.news.utils.cache_utils import DiskCacheManager
+
+        self.root = root or settings.ARTICLE_CACHE_SEGMENT_DIR
+        self.codec = codec or settings.ARTICLE_CACHE_CODEC
+        self.segment_size = segment_size or settings.ARTICLE_CACHE_SEGMENT_SIZE
+        self.legacy = FileCacheBackend(legacy_root) if settings.ARTICLE_CACHE_LEGACY_FALLBACK else None
+        self.index = DiskCacheManager.get(settings.ARTICLE_CACHE_SEGMENT_INDEX)
+        self.codecs = Codecs(self.codec, level)
+        self.maps = {}
+        self.lock = threading.Lock()
+
+    def get_segment_path(self, segment):
+        return os.path.join(self.root, '%08d.warc' % segment)
+
+    def get_segments(self):
+        if not os.path.isdir(self.root):
+            return []
+        segments = []
+        for entry in os.scandir(self.root):
+            match = self.SEGMENT_RE.match(entry.name)
+            if match:
+                segments.append(int(match.group(1)))
+        return sorted(segments)
+
+    def get_closed_segments(self):
+        return [self.get_segment_path(segment) for segment in self.get_segments()[:-1]]
+
+    def _get_active_segment(self):
+        segments = self.get_segments()
+        if not segments:
+            return 0
+        segment = segments[-1]
+        if os.path.getsize(self.get_segment_path(segment)) >= self.segment_size:
+            segment += 1
+        return segment
+
+    def _get_location(self, key):
+        try:
+            return loads(self.index[key])
+        except KeyError:
+            return
+
+    def exists(self, key):
+        return key in self.index or (self.legacy is not None and self.legacy.exists(key))
+
+    def _read_range(self, segment, offset, length):
+        # slicing happens under the lock as well since a remap closes the old map
+        with self.lock:
+            mm = self.maps.get(segment)
+            # the active segment keeps growing after it was mapped
+            if mm is None or len(mm) < offset + length:
+                if mm is not None:
+                    mm.close()
+                with open(self.get_segment_path(segment), 'rb') as f:
+                    mm = self.maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return mm[offset:offset + length]
+
+    def read(self, key):
+        info = self._get_location(key)
+        if info is None:
+            if self.legacy is not None:
+                return self.legacy.read(key)
+            raise KeyError(key)
+        data = self._read_range(info['segment'], info['offset'], info['length'])
+        return self.codecs.decompress(data, info['codec']).decode('utf-8')
+
+    @staticmethod
+    def _get_header(key, url, codec, fetched_on, length):
+        lines = [
+            'WARC/1.0',
+            'WARC-Type: response',
+            'WARC-Record-ID: <urn:md5:%s>' % key,
+            'WARC-Target-URI: %s' % (url or ''),
+            'WARC-Date: %s' % time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(fetched_on)),
+            'Content-Type: text/html; charset=utf-8',
+            'Content-Encoding: %s' % codec,
+            'Content-Length: %s' % length,
+        ]
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8')
+
+    def write(self, key, html, url=None, fetched_on=None):
+        data = html.encode('utf-8')
+        compressed = self.codecs.compress(data)
+        fetched_on = fetched_on or int(time.time())
+        header = self._get_header(key, url, self.codec, fetched_on, len(compressed))
+
+        mkdir_p(self.root)
+        # other processes append to the same segment so picking the segment and
+        # appending has to happen under one lock
+        with open(os.path.join(self.root, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                segment = self._get_active_segment()
+                with open(self.get_segment_path(segment), 'ab') as f:
+                    offset = f.tell() + len(header)
+                    f.write(header + compressed + b'\r\n\r\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        self.index[key] = dumps({
+            'segment': segment,
+            'offset': offset,
+            'length': len(compressed),
+            'codec': self.codec,
+            'url': url,
+            'size': len(data),
+            'fetched_on': fetched_on,
+        })
+
+    def delete(self, key):
+        """
+        only drops the key from the index - the record stays in its segment
+        """
+        try:
+            del self.index[key]
+        except KeyError:
+            pass
+
+    def get_info(self, key):
+        return self._get_location(key)
+
+    def iter_records(self, segment):
+        """
+        sequentially reads a segment and yields (key, url, html). records that
+        were deleted or later overwritten are yielded too. a torn final record
+        (from a writer that died mid-append) is skipped
+        """
+        path = self.get_segment_path(segment)
+        with open(path, 'rb') as f:
+            while True:
+                line = f.readline()
+                if not line:
+                    return
+                if line.strip() != b'WARC/1.0':
+                    continue
+                headers = {}
+                while True:
+                    line = f.readline()
+                    if line in (b'\r\n', b''):
+                        break
+                    name, _, value = line.decode('utf-8', errors='replace').partition(':')
+                    headers[name] = value.strip()
+                if not line or 'Content-Length' not in headers:
+                    _LOG.warning('torn record header at the end of segment:[%s] - skipping it', path)
+                    return
+                length = int(headers['Content-Length'])
+                payload = f.read(length)
+                if len(payload) < length:
+                    _LOG.warning('torn record at the end of segment:[%s] - skipping it', path)
+                    return
+                key = headers['WARC-Record-ID'][len('<urn:md5:'):-1]
+                html = self.codecs.decompress(payload, headers['Content-Encoding']).decode('utf-8')
+                yield key, headers['WARC-Target-URI'] or None, html
+
+    def keys(self):
+        for key in self.index.keys():
+            yield key.decode('utf-8') if isinstance(key, bytes) else key
+
+
+CACHE_BACKEND = None
+
+
+def get_cache_backend():
+    global CACHE_BACKEND
+    if CACHE_BACKEND is None:
+        CACHE_BACKEND = get_object_from_python_path(settings.ARTICLE_CACHE_BACKEND)()
+    return CACHE_BACKEND
@@ -1,47 +1,75 @@
+from contextlib import contextmanager
+import fcntl
+import glob
 import hashlib
+import itertools
+import logging
 import os
+import time
+from urllib.parse import urlparse
 
 from lsm import LSM
-import requests
 from scrapy.extensions.httpcache import FilesystemCacheStorage
 from tqdm import tqdm
 from urlnormalizer import normalize_url
 
 from django.conf import settings
 
+from mnemonic.news.utils.bloom_utils import BloomFilter
+from mnemonic.news.utils.cache_backends import get_cache_backend
 from mnemonic.news.utils.class_utils import get_object_from_python_path
-from mnemonic.news.utils.file_utils import ShelveFile, mkdir_p
+from mnemonic.news.utils.download_utils import get_downloader
+from mnemonic.news.utils.iter_utils import chunkify
+from mnemonic.news.utils.msgpack_utils import dumps, loads
+
+_LOG = logging.getLogger(__name__)
 
 
 class DownloadCache(object):
-    def __init__(self, url):
+    def __init__(self, url, backend=None):
         self.original_url = url
         self.url = normalize_url(url)
         self.url_hash = hashlib.md5(url.encode('utf-8')).hexdigest()
-        self.cache_path = os.path.join(settings.ARTICLE_CACHE_DIR, self.url_hash)
+        self.backend = backend or get_cache_backend()
 
     def is_cached(self):
-        return os.path.exists(self.cache_path)
+        return self.backend.exists(self.url_hash)
 
     def cache(self, html):
-        if not isinstance(html, str):
+        if isinstance(html, bytes):
+            html = html.decode('utf-8', errors='replace')
+        elif not isinstance(html, str):
             html = str(html)
-        mkdir_p(os.path.dirname(self.cache_path))
-        with ShelveFile(self.cache_path) as f:
-            f.write(html)
+        self.backend.write(self.url_hash, html, url=self.url)
 
     def _get(self):
-        return open(self.cache_path).read()
+        return self.backend.read(self.url_hash)
 
-    def get(self):
+    def get(self, cache_only=False):
         if self.is_cached():
             return self._get()
+        elif cache_only:
+            return
 
-        r = requests.get(self.url)
+        r = get_downloader().get(self.url)
+        r.raise_for_status()
         html = r.text
         self.cache(html)
         return html
 
+    @classmethod
+    def get_many(cls, urls, cache_only=False):
+        caches = [cls(url) for url in urls]
+        htmls = [dc._get() if dc.is_cached() else None for dc in caches]
+        missing = [i for i, html in enumerate(htmls) if html is None]
+        if missing and not cache_only:
+            fetched = get_downloader().get_many([caches[i].url for i in missing])
+            for i, html in zip(missing, fetched):
+                if html is not None:
+                    caches[i].cache(html)
+                    htmls[i] = html
+        return htmls
+
 
 class DownloadCacheStorage(FilesystemCacheStorage):
     def store_response(self, spider, request, response):
@@ -57,17 +85,255 @@ class DownloadCacheStorage(FilesystemCacheStorage):
 
 
 class DiskCacheManager(object):
+    @classmethod
+    def get_path(cls, name):
+        if settings.DISK_CACHES.get(name, {}).get('per_index_version'):
+            # mirrors what is in one version of the search indices, so a version
+            # bump starts from an empty set
+            from mnemonic.news.search_indices import News
+            name = '%s_%s' % (name, News.get_index_prefix())
+        return settings.DISK_CACHE_ROOT + name + '.ldb'
+
     @classmethod
     def get(cls, name):
-        path = settings.DISK_CACHE_ROOT + name + '.ldb'
-        return LSM(path)
+        return LSM(cls.get_path(name))
+
+    @classmethod
+    def clear_index_caches(cls):
+        """
+        for when the search indices are dropped - the caches that mirror them
+        would otherwise claim that everything is still indexed
+        """
+        for name, cfg in settings.DISK_CACHES.items():
+            if not cfg.get('per_index_version'):
+                continue
+            for path in glob.glob(settings.DISK_CACHE_ROOT + name + '_*.ldb*'):
+                _LOG.info('removing [%s]', path)
+                os.remove(path)
 
     @classmethod
     def update(cls, name, **kwargs):
         cfg = settings.DISK_CACHES[name]
         fn = get_object_from_python_path(cfg['fn'])
         data = fn(**kwargs)
-        cache = cls.get(name)
         if cfg['type'] == 'set':
             items = tqdm(data, desc='updating diskcache:%s' % name)
-            cache.update({item: True for item in items})
+            DiskCacheSet(name).add_many(items)
+
+
+class DiskCacheSet(object):
+    UPDATE_CHUNK_SIZE = 10 * 1000
+
+    def __init__(self, name, use_bloom_filter=False, bloom_filter_capacity=None, bloom_filter_error_rate=None):
+        self.name = name
+        self.cache = DiskCacheManager.get(name)
+        if use_bloom_filter:
+            self.bloom_filter = BloomFilter(bloom_filter_capacity or settings.DISK_CACHE_BLOOM_FILTER_CAPACITY,
+                                            bloom_filter_error_rate or settings.DISK_CACHE_BLOOM_FILTER_ERROR_RATE)
+            self.bloom_filter.update(tqdm(self.cache.keys(), desc='loading bloom filter:%s' % name))
+        else:
+            self.bloom_filter = None
+
+    def __str__(self):
+        return '<DiskCacheSet:%s>' % self.name
+
+    def get_key(self, item):
+        return item
+
+    def _contains_key(self, key):
+        if self.bloom_filter is not None and key not in self.bloom_filter:
+            return False
+        return key in self.cache
+
+    def __contains__(self, item):
+        return self._contains_key(self.get_key(item))
+
+    def contains_many(self, items):
+        return {item for item in items if self._contains_key(self.get_key(item))}
+
+    def add(self, item):
+        self.add_many([item])
+
+    def add_many(self, items):
+        keys = (self.get_key(item) for item in items)
+        for chunk in chunkify(keys, self.UPDATE_CHUNK_SIZE):
+            chunk = list(chunk)
+            self.cache.update({key: True for key in chunk})
+            if self.bloom_filter is not None:
+                self.bloom_filter.update(chunk)
+
+
+def get_url_key(url):
+    # http and https versions of a url are treated as the same article
+    parsed = urlparse(normalize_url(url))
+    return parsed._replace(scheme='').geturl()
+
+
+class SeenURLIndex(DiskCacheSet):
+    def __init__(self, **kwargs):
+        super(SeenURLIndex, self).__init__(settings.DISK_CACHE_SEEN_URLS, **kwargs)
+
+    def get_key(self, item):
+        return get_url_key(item)
+
+
+SEEN_URL_INDEX = None
+
+
+def get_seen_url_index():
+    global SEEN_URL_INDEX
+    if SEEN_URL_INDEX is None:
+        SEEN_URL_INDEX = SeenURLIndex()
+    return SEEN_URL_INDEX
+
+
+class SeenTweetIndex(DiskCacheSet):
+    def __init__(self, **kwargs):
+        super(SeenTweetIndex, self).__init__(settings.DISK_CACHE_SEEN_TWEETS, **kwargs)
+
+    def get_key(self, item):
+        return str(item)
+
+
+SEEN_TWEET_INDEX = None
+
+
+def get_seen_tweet_index():
+    global SEEN_TWEET_INDEX
+    if SEEN_TWEET_INDEX is None:
+        SEEN_TWEET_INDEX = SeenTweetIndex(use_bloom_filter=settings.SEEN_TWEET_INDEX_USE_BLOOM_FILTER)
+    return SEEN_TWEET_INDEX
+
+
+def update_seen_urls_disk_cache(since=None):
+    from mnemonic.news.models import Article
+
+    qs = Article.objects.all()
+    if since:
+        qs = qs.filter(created_on__gte=since)
+    for url in qs.values_list('url', flat=True).iterator():
+        yield get_url_key(url)
+
+
+class ExtractionCache(object):
+    """
+    memoizes extraction results by a hash of the html and the extractor version.
+    entries are evicted oldest first once their total size goes over max_size.
+    every entry has an 'e:<key>' record with [written_on, result] and a
+    't:<written_on>:<key>' record with its size that is used to find the oldest
+    entries. the running total size is kept in 's:size'
+    """
+    EVICT_EVERY = 1000
+    EVICT_BATCH_SIZE = 1000
+    LOW_WATER_MARK = 0.9
+    SIZE_KEY = 's:size'
+
+    def __init__(self, name=None, version=None, max_size=None):
+        self.name = name or settings.ARTICLE_EXTRACTION_CACHE
+        self.version = version or settings.ARTICLE_EXTRACTOR_VERSION
+        self.max_size = max_size or settings.ARTICLE_EXTRACTION_CACHE_MAX_SIZE
+        self.cache = DiskCacheManager.get(self.name)
+        self.lock_path = settings.DISK_CACHE_ROOT + self.name + '.lock'
+        self.num_writes = 0
+
+    def __str__(self):
+        return '<ExtractionCache:%s>' % self.name
+
+    @contextmanager
+    def locked(self):
+        # other processes update the size too
+        with open(self.lock_path, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get_key(self, html):
+        if isinstance(html, str):
+            html = html.encode('utf-8')
+        return '%s:%s' % (self.version, hashlib.sha1(html).hexdigest())
+
+    def _get_entry(self, key):
+        try:
+            entry = loads(self.cache['e:' + key])
+        except KeyError:
+            return None, None
+        # entries from before written_on was stored are bare results
+        if isinstance(entry, list):
+            return entry
+        return None, entry
+
+    def get(self, key):
+        written_on, result = self._get_entry(key)
+        return result
+
+    def get_size(self):
+        try:
+            return int(self.cache[self.SIZE_KEY])
+        except KeyError:
+            return sum(int(size) for k, size in self.cache['t:':'t;'])
+
+    def set(self, key, result):
+        written_on = int(time.time() * 1000 * 1000)
+        value = dumps([written_on, result])
+        with self.locked():
+            self.cache.update({
+                'e:' + key: value,
+                't:%016d:%s' % (written_on, key): str(len(value)),
+                self.SIZE_KEY: str(self.get_size() + len(value)),
+            })
+        self.num_writes += 1
+        if self.num_writes % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def _evict_batch(self, low_water_mark):
+        """
+        returns the number of t: records removed, entries evicted and the size left
+        """
+        with self.locked():
+            total_size = self.get_size()
+            num_removed = num_evicted = 0
+            batch = list(itertools.islice(self.cache['t:':'t;'], self.EVICT_BATCH_SIZE))
+            for t_key, size in batch:
+                if total_size <= low_water_mark:
+                    break
+                written_on, key = t_key.decode('utf-8').split(':', 2)[1:]
+                # an entry that has been rewritten since belongs to its newer t: record
+                entry_written_on, result = self._get_entry(key)
+                if result is not None and entry_written_on in (None, int(written_on)):
+                    del self.cache['e:' + key]
+                    num_evicted += 1
+                del self.cache[t_key]
+                total_size -= int(size)
+                num_removed += 1
+            if not batch:
+                total_size = 0
+            self.cache[self.SIZE_KEY] = str(total_size)
+            return num_removed, num_evicted, total_size
+
+    def evict(self):
+        """
+        walks t: records oldest first, only as far as needed to get under the low water mark
+        """
+        total_size = self.get_size()
+        if total_size <= self.max_size:
+            return
+        low_water_mark = self.max_size * self.LOW_WATER_MARK
+        num_evicted = 0
+        while total_size > low_water_mark:
+            num_removed, n, total_size = self._evict_batch(low_water_mark)
+            num_evicted += n
+            if not num_removed:
+                break
+        _LOG.info('%s - evicted %s entries, size:%s', self, num_evicted, total_size)
+
+
+EXTRACTION_CACHE = None
+
+
+def get_extraction_cache():
+    global EXTRACTION_CACHE
+    if EXTRACTION_CACHE is None:
+        EXTRACTION_CACHE = ExtractionCache()
+    return EXTRACTION_CACHE
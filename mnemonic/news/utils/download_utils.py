@@ -0,0 +1,169 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from django.conf import settings
+
+_LOG = logging.getLogger(__name__)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket(object):
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_on = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        takes a token and returns how long the caller has to wait before using it.
+        tokens can go negative so that callers queue up behind each other
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_on) * self.rate)
+            self.updated_on = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            else:
+                return -self.tokens / self.rate
+
+
+class DomainStats(object):
+    def __init__(self):
+        self.num_requests = 0
+        self.num_errors = 0
+        self.num_bytes = 0
+        self.total_time = 0.0
+
+    def record(self, elapsed, num_bytes=0, is_error=False):
+        self.num_requests += 1
+        self.num_errors += int(is_error)
+        self.num_bytes += num_bytes
+        self.total_time += elapsed
+
+    def to_dict(self):
+        return {
+            'num_requests': self.num_requests,
+            'num_errors': self.num_errors,
+            'num_bytes': self.num_bytes,
+            'avg_time': self.total_time / self.num_requests if self.num_requests else None,
+        }
+
+
+class Downloader(object):
+    def __init__(self, timeout=None, retries=None, backoff=None, rate_limit=None, burst=None,
+                 concurrency_per_domain=None):
+        self.timeout = timeout or settings.DOWNLOADER_TIMEOUT
+        self.retries = settings.DOWNLOADER_RETRIES if retries is None else retries
+        self.backoff = backoff or settings.DOWNLOADER_BACKOFF
+        self.rate_limit = rate_limit or settings.DOWNLOADER_RATE_LIMIT
+        self.burst = burst or settings.DOWNLOADER_BURST
+        self.concurrency_per_domain = concurrency_per_domain or settings.DOWNLOADER_CONCURRENCY_PER_DOMAIN
+
+        self.headers = {}
+        if settings.DOWNLOADER_USER_AGENT:
+            self.headers['User-Agent'] = settings.DOWNLOADER_USER_AGENT
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=settings.DOWNLOADER_POOL_SIZE,
+                              pool_maxsize=self.concurrency_per_domain,
+                              max_retries=Retry(total=self.retries,
+                                                backoff_factor=self.backoff,
+                                                status_forcelist=RETRY_STATUSES))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.semaphores = {}
+        self.stats = defaultdict(DomainStats)
+
+    @staticmethod
+    def get_domain(url):
+        return urlparse(url).netloc
+
+    def _get_bucket(self, domain):
+        with self.lock:
+            if domain not in self.buckets:
+                rate = settings.DOWNLOADER_DOMAIN_RATE_LIMITS.get(domain, self.rate_limit)
+                self.buckets[domain] = TokenBucket(rate, self.burst)
+            return self.buckets[domain]
+
+    def _get_semaphore(self, domain):
+        with self.lock:
+            if domain not in self.semaphores:
+                self.semaphores[domain] = threading.BoundedSemaphore(self.concurrency_per_domain)
+            return self.semaphores[domain]
+
+    def _record(self, domain, elapsed, num_bytes=0, is_error=False):
+        with self.lock:
+            self.stats[domain].record(elapsed, num_bytes, is_error)
+            num_requests = sum(stats.num_requests for stats in self.stats.values())
+        if num_requests % settings.DOWNLOADER_METRICS_LOG_INTERVAL == 0:
+            self.log_metrics()
+
+    def get_metrics(self):
+        with self.lock:
+            return {domain: stats.to_dict() for domain, stats in self.stats.items()}
+
+    def log_metrics(self):
+        for domain, d in sorted(self.get_metrics().items()):
+            _LOG.info('downloader metrics - domain:[%s] requests:%s errors:%s bytes:%s avg_time:%.2fs',
+                      domain, d['num_requests'], d['num_errors'], d['num_bytes'], d['avg_time'])
+
+    def get(self, url, headers=None, timeout=None):
+        domain = self.get_domain(url)
+        with self._get_semaphore(domain):
+            time.sleep(self._get_bucket(domain).reserve())
+            start = time.time()
+            try:
+                r = self.session.get(url, headers=headers, timeout=timeout or self.timeout)
+            except requests.RequestException:
+                self._record(domain, time.time() - start, is_error=True)
+                raise
+            self._record(domain, time.time() - start, len(r.content), is_error=r.status_code >= 400)
+            return r
+
+    def _get_html(self, url):
+        try:
+            r = self.get(url)
+        except requests.RequestException as ex:
+            _LOG.warning('error fetching url:[%s] - %s', url, ex)
+            return
+        if r.status_code >= 400:
+            _LOG.warning('error fetching url:[%s] - status:%s', url, r.status_code)
+            return
+        return r.text
+
+    def get_many(self, urls):
+        """
+        fetches urls concurrently and returns their html in the same order - None for failures.
+        goes through get() so that the session's connections and the per-domain caps
+        and rate limits are shared with every other caller in the process (including
+        the other greenlets of a gevent worker)
+        """
+        if not urls:
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(urls), settings.DOWNLOADER_MAX_WORKERS)) as executor:
+            return list(executor.map(self._get_html, urls))
+
+
+DOWNLOADER = None
+
+
+def get_downloader():
+    global DOWNLOADER
+    if DOWNLOADER is None:
+        DOWNLOADER = Downloader()
+    return DOWNLOADER
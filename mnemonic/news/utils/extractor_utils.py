@@ -0,0 +1,153 @@
+import logging
+from urllib.parse import urlparse
+
+from dateutil.parser import parse as parse_date
+import lxml.html
+from lxml.etree import XPath
+from newspaper import Article as NArticle
+
+from django.conf import settings
+
+from mnemonic.news.utils.class_utils import get_object_from_python_path
+
+_LOG = logging.getLogger(__name__)
+
+
+class BaseExtractor(object):
+    name = None
+    domains = []
+
+    def extract(self, url, html):
+        raise NotImplementedError
+
+    def is_valid(self, result):
+        return result is not None and len(result['text'] or '') >= settings.ARTICLE_EXTRACTOR_MIN_BODY_LENGTH
+
+
+class NewspaperExtractor(BaseExtractor):
+    name = 'newspaper'
+
+    def extract(self, url, html):
+        narticle = NArticle(url, fetch_images=False)
+        narticle.set_html(html)
+        narticle.parse()
+        return {
+            'extractor': self.name,
+            'text': narticle.text,
+            'title': narticle.title,
+            'authors': narticle.authors,
+            'publish_date': narticle.publish_date,
+            'top_image': narticle.top_image,
+            'meta_description': narticle.meta_description,
+            'meta_keywords': narticle.meta_keywords,
+            'meta_lang': narticle.meta_lang,
+        }
+
+
+class XPathExtractor(BaseExtractor):
+    """
+    pulls the body out of the paragraphs matched by body_xpath. subclasses only
+    need to set name, domains and body_xpath
+    """
+    body_xpath = None
+    title_xpath = '//meta[@property="og:title"]/@content | //title/text()'
+    authors_xpath = '//meta[@name="author"]/@content'
+    publish_date_xpath = '//meta[@property="article:published_time"]/@content'
+    top_image_xpath = '//meta[@property="og:image"]/@content'
+    meta_description_xpath = '//meta[@name="description"]/@content'
+    meta_keywords_xpath = '//meta[@name="keywords"]/@content'
+    meta_lang_xpath = '/html/@lang'
+    strip_xpath = '//script | //style | //noscript'
+
+    _compiled = None
+
+    @classmethod
+    def get_xpaths(cls):
+        # compiled once per class and shared by every instance
+        if cls.__dict__.get('_compiled') is None:
+            cls._compiled = {
+                field: XPath(getattr(cls, field + '_xpath'))
+                for field in ('body', 'title', 'authors', 'publish_date', 'top_image',
+                              'meta_description', 'meta_keywords', 'meta_lang', 'strip')
+            }
+        return cls._compiled
+
+    @staticmethod
+    def _first(values):
+        for value in values:
+            value = value.strip()
+            if value:
+                return value
+
+    def extract(self, url, html):
+        xpaths = self.get_xpaths()
+        if isinstance(html, str):
+            html = html.encode('utf-8')
+        tree = lxml.html.fromstring(html)
+        for node in xpaths['strip'](tree):
+            node.drop_tree()
+
+        paragraphs = (' '.join(node.text_content().split()) for node in xpaths['body'](tree))
+        publish_date = self._first(xpaths['publish_date'](tree))
+        if publish_date:
+            try:
+                publish_date = parse_date(publish_date)
+            except (ValueError, OverflowError):
+                publish_date = None
+        authors = self._first(xpaths['authors'](tree))
+        meta_keywords = self._first(xpaths['meta_keywords'](tree))
+        return {
+            'extractor': self.name,
+            'text': '\n\n'.join(p for p in paragraphs if p),
+            'title': self._first(xpaths['title'](tree)),
+            'authors': [authors] if authors else [],
+            'publish_date': publish_date,
+            'top_image': self._first(xpaths['top_image'](tree)),
+            'meta_description': self._first(xpaths['meta_description'](tree)),
+            'meta_keywords': [k.strip() for k in meta_keywords.split(',')] if meta_keywords else [],
+            'meta_lang': self._first(xpaths['meta_lang'](tree)),
+        }
+
+
+EXTRACTORS = None
+FALLBACK_EXTRACTOR = None
+
+
+def get_extractors():
+    global EXTRACTORS
+    if EXTRACTORS is None:
+        EXTRACTORS = {}
+        for python_path in settings.ARTICLE_EXTRACTORS:
+            extractor = get_object_from_python_path(python_path)()
+            for domain in extractor.domains:
+                EXTRACTORS[domain] = extractor
+    return EXTRACTORS
+
+
+def get_fallback_extractor():
+    global FALLBACK_EXTRACTOR
+    if FALLBACK_EXTRACTOR is None:
+        FALLBACK_EXTRACTOR = get_object_from_python_path(settings.ARTICLE_FALLBACK_EXTRACTOR)()
+    return FALLBACK_EXTRACTOR
+
+
+def get_extractor(url):
+    return get_extractors().get(urlparse(url).netloc)
+
+
+def extract(url, html):
+    """
+    uses the extractor registered for the url's domain and falls back to
+    newspaper when there isn't one or when its output doesn't look like an article
+    """
+    extractor = get_extractor(url)
+    if extractor is not None:
+        try:
+            result = extractor.extract(url, html)
+        except Exception as ex:
+            _LOG.warning('extractor:[%s] failed on url:[%s] - %s', extractor.name, url, ex)
+        else:
+            if extractor.is_valid(result):
+                return result
+            _LOG.debug('extractor:[%s] returned an invalid result for url:[%s]', extractor.name, url)
+    return get_fallback_extractor().extract(url, html)
@@ -1,2 +1,108 @@
+import asyncio
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import logging
+import time
+from urllib.parse import urlparse
+
+import aiohttp
+import feedparser
+
+from django.conf import settings
+from django.db import connections
+
+_LOG = logging.getLogger(__name__)
+
+
 def get_feed_url_from_google_sheet_id(sheet_id):
     return 'https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv&id={sheet_id}&gid=0'.format(sheet_id=sheet_id)
+
+
+def get_content_hash(body):
+    return hashlib.md5(body).hexdigest()
+
+
+class FeedCrawlResult(object):
+    def __init__(self, feed):
+        self.feed = feed
+        self.entries = None
+        self.headers = None
+        self.content_hash = None
+        self.is_unchanged = False
+        self.error = None
+        self.fetch_time = None
+        self.parse_time = None
+
+    def __str__(self):
+        return '<FeedCrawlResult:%s - fetch:%s parse:%s error:%s>' % (self.feed, self.fetch_time,
+                                                                     self.parse_time, self.error)
+
+    @property
+    def is_ok(self):
+        return self.error is None
+
+
+def parse_feed(body, headers):
+    start = time.time()
+    d = feedparser.parse(body, response_headers=headers)
+    return d['entries'], time.time() - start
+
+
+async def _crawl_feed(session, pool, feed, semaphore, host_semaphore):
+    result = FeedCrawlResult(feed)
+    try:
+        async with semaphore, host_semaphore:
+            start = time.time()
+            async with session.get(feed.url, headers=feed.get_crawl_headers()) as response:
+                response.raise_for_status()
+                body = await response.read()
+                status = response.status
+                result.headers = {k.lower(): v for k, v in response.headers.items()}
+            result.fetch_time = time.time() - start
+
+        result.content_hash = get_content_hash(body)
+        if feed.is_unchanged(status, result.content_hash):
+            result.is_unchanged = True
+            result.parse_time = 0.0
+            _LOG.info('feed:[%s] - fetched in %.2fs, unchanged', feed, result.fetch_time)
+            return result
+
+        loop = asyncio.get_event_loop()
+        result.entries, result.parse_time = await loop.run_in_executor(pool, parse_feed, body, result.headers)
+    except Exception as ex:
+        result.error = ex
+        _LOG.warning('feed:[%s] - error crawling url:[%s] - %s', feed, feed.url, ex)
+    else:
+        _LOG.info('feed:[%s] - fetched in %.2fs, parsed in %.2fs, entries:%s',
+                  feed, result.fetch_time, result.parse_time, len(result.entries))
+    return result
+
+
+async def _crawl_feeds(feeds, pool, concurrency, concurrency_per_host, timeout):
+    semaphore = asyncio.Semaphore(concurrency)
+    host_semaphores = defaultdict(lambda: asyncio.Semaphore(concurrency_per_host))
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency_per_host)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        tasks = [_crawl_feed(session, pool, feed, semaphore, host_semaphores[urlparse(feed.url).netloc])
+                 for feed in feeds]
+        return await asyncio.gather(*tasks)
+
+
+def crawl_feeds_concurrently(feeds, concurrency=None, concurrency_per_host=None, timeout=None, workers=None):
+    """
+    fetches all feeds at once (capped globally and per host) and parses them
+    in a process pool. returns a FeedCrawlResult per feed - processing the
+    entries is left to the caller since the ORM can't be used from the event loop
+    """
+    feeds = list(feeds)
+    concurrency = concurrency or settings.FEED_CRAWL_CONCURRENCY
+    concurrency_per_host = concurrency_per_host or settings.FEED_CRAWL_CONCURRENCY_PER_HOST
+    timeout = timeout or settings.FEED_CRAWL_TIMEOUT
+    workers = workers or settings.FEED_PARSE_WORKERS
+
+    # don't let the parse workers inherit open db connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return asyncio.run(_crawl_feeds(feeds, pool, concurrency, concurrency_per_host, timeout))
@@ -0,0 +1,148 @@
+import logging
+import struct
+import zlib
+
+import zstandard
+
+from mnemonic.news.utils.msgpack_utils import dumps, loads
+
+_LOG = logging.getLogger(__name__)
+MAGIC = b'MNF1'
+# magic, codec, payload length, crc32 of the payload as stored
+HEADER = struct.Struct('<4sBII')
+CODECS = {'raw': 0, 'zstd': 1}
+RESYNC_CHUNK_SIZE = 64 * 1024
+# anything longer is taken to be a corrupt length
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+
+
+class FrameError(ValueError):
+    pass
+
+
+def encode_frame(records, codec='zstd', compressor=None):
+    """
+    one length-prefixed, checksummed frame holding records as a msgpack list,
+    compressed independently of every other frame
+    """
+    payload = dumps(records)
+    if codec == 'zstd':
+        payload = (compressor or zstandard.ZstdCompressor()).compress(payload)
+    if len(payload) > MAX_FRAME_SIZE:
+        raise FrameError('frame of %s byte(s) is too large - write fewer records per frame' % len(payload))
+    return HEADER.pack(MAGIC, CODECS[codec], len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_frame(frame):
+    if len(frame) < HEADER.size:
+        raise FrameError('truncated header')
+    magic, codec, length, crc = HEADER.unpack_from(frame)
+    if magic != MAGIC:
+        raise FrameError('bad magic:%r' % magic)
+    payload = frame[HEADER.size:HEADER.size + length]
+    if len(payload) != length:
+        raise FrameError('truncated payload - expected %s byte(s), got %s' % (length, len(payload)))
+    if zlib.crc32(payload) != crc:
+        raise FrameError('checksum mismatch')
+    if codec == CODECS['zstd']:
+        payload = zstandard.ZstdDecompressor().decompress(payload)
+    elif codec != CODECS['raw']:
+        raise FrameError('unknown codec:%s' % codec)
+    return loads(payload, unicode_errors='replace')
+
+
+def decode_frame_or_skip(frame):
+    try:
+        return decode_frame(frame)
+    except FrameError as ex:
+        _LOG.warning('skipping corrupt frame - %s', ex)
+        return []
+
+
+class FrameWriter(object):
+    def __init__(self, f, codec='zstd', level=3):
+        self.file = f
+        self.codec = codec
+        self.compressor = zstandard.ZstdCompressor(level=level)
+
+    def write(self, records):
+        frame = encode_frame(records, self.codec, self.compressor)
+        self.file.write(frame)
+        return len(frame)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class FrameReader(object):
+    """
+    reads the frames written by FrameWriter from any file-like object. a torn
+    final frame (from a writer that died mid-write) ends the stream. corrupt
+    frames and garbage between frames are skipped by scanning for the next
+    frame's magic rather than trusting the length, which may be what's corrupt
+    """
+    def __init__(self, f):
+        self.file = f
+        self.pending = b''
+
+    def _read(self, size):
+        data = self.pending[:size]
+        self.pending = self.pending[size:]
+        if len(data) < size:
+            data += self.file.read(size - len(data))
+        return data
+
+    def _resync(self, data):
+        start = 1
+        while True:
+            i = data.find(MAGIC, start)
+            if i >= 0:
+                self.pending = data[i:] + self.pending
+                return True
+            more = self._read(RESYNC_CHUNK_SIZE)
+            if not more:
+                return False
+            # the magic may straddle two reads
+            data = data[-(len(MAGIC) - 1):] + more
+            start = 0
+
+    def iter_frames(self):
+        """
+        raw frames, checksummed but not yet decoded, so that decoding can be spread over processes
+        """
+        while True:
+            header = self._read(HEADER.size)
+            if not header:
+                return
+            if len(header) < HEADER.size:
+                _LOG.warning('torn frame header at the end of the stream - ignoring it')
+                return
+            magic, codec, length, crc = HEADER.unpack(header)
+            if magic != MAGIC or length > MAX_FRAME_SIZE:
+                _LOG.warning('bad frame header - scanning for the next frame')
+                if not self._resync(header):
+                    return
+                continue
+            payload = self._read(length)
+            if len(payload) == length and zlib.crc32(payload) == crc:
+                yield header + payload
+                continue
+            # frames covered by a corrupt length are still in payload
+            if not self._resync(header + payload):
+                _LOG.warning('torn frame at the end of the stream - ignoring %s byte(s)', len(header) + len(payload))
+                return
+            _LOG.warning('corrupt frame - scanning for the next frame')
+
+    def iter_records(self, pool=None):
+        if pool is None:
+            decoded = map(decode_frame_or_skip, self.iter_frames())
+        else:
+            decoded = pool.imap(decode_frame_or_skip, self.iter_frames())
+        for records in decoded:
+            yield from records
+
+    def __iter__(self):
+        return self.iter_records()
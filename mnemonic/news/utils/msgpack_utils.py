@@ -7,12 +7,18 @@ import msgpack.exceptions
 _LOG = logging.getLogger(__name__)
 
 
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
 def decode_datetime(obj):
     if '__datetime__' in obj:
         try:
-            if isinstance(obj['as_str'], bytes):
-                obj['as_str'] = obj['as_str'].decode('utf-8')
-            obj = datetime.datetime.strptime(obj['as_str'], "%Y%m%dT%H:%M:%S.%f")
+            if 'utc_ts' in obj:
+                obj = EPOCH + datetime.timedelta(microseconds=obj['utc_ts'])
+            else:
+                if isinstance(obj['as_str'], bytes):
+                    obj['as_str'] = obj['as_str'].decode('utf-8')
+                obj = datetime.datetime.strptime(obj['as_str'], "%Y%m%dT%H:%M:%S.%f")
         except Exception as ex:
             _LOG.warning('error decoding datetime:%s - %s', obj, ex)
             obj = None
@@ -21,7 +27,11 @@ def decode_datetime(obj):
 
 def encode_datetime(obj):
     if isinstance(obj, datetime.datetime):
-        obj = {'__datetime__': True, 'as_str': obj.strftime("%Y%m%dT%H:%M:%S.%f").encode()}
+        if obj.tzinfo is not None and obj.utcoffset() is not None:
+            # aware datetimes are stored as microseconds since the epoch and come back in utc
+            obj = {'__datetime__': True, 'utc_ts': (obj - EPOCH) // datetime.timedelta(microseconds=1)}
+        else:
+            obj = {'__datetime__': True, 'as_str': obj.strftime("%Y%m%dT%H:%M:%S.%f").encode()}
     return obj
 
 
@@ -45,7 +55,7 @@ def streaming_loads2(stream, **kwargs):
         try:
             input_data.skip()
         except msgpack.exceptions.OutOfData:
-            print('error skipping data. msgpack says no more data')
+            _LOG.warning('error skipping data. msgpack says no more data')
             return
         while True:
             try:
@@ -53,21 +63,21 @@ def streaming_loads2(stream, **kwargs):
             except StopIteration:
                 return
             except ValueError as ex:
-                print('error skipping entry - %s. scanning for next good item...' % ex)
+                _LOG.warning('error skipping entry - %s. scanning for next good item...', ex)
                 yield from skip_loop(input_data)
             else:
                 if isinstance(skip_value, dict):
-                    print('found good entry')
+                    _LOG.info('found good entry')
                     yield skip_value
                     break
                 else:
-                    print('skip partial entry', skip_value)
+                    _LOG.debug('skip partial entry - %s', skip_value)
     input_data = streaming_loads(stream, unicode_errors='replace', **kwargs)
     while True:
         try:
             value = next(input_data)
         except ValueError as ex:
-            print('error reading entry - %s. scanning for next good item...' % ex)
+            _LOG.warning('error reading entry - %s. scanning for next good item...', ex)
             yield from skip_loop(input_data)
         except StopIteration:
             return
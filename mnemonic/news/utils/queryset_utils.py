@@ -1,5 +1,4 @@
 from collections import defaultdict
-import gc
 import logging
 
 from tqdm import tqdm
@@ -46,17 +45,32 @@ def bulk_create(objs, should_bulk_create=True):
                     raise ex
 
 
-def queryset_iterator(queryset, chunksize=10000, key=None):
-    # https://stackoverflow.com/a/47854200
-
-    key = [key] if isinstance(key, str) else (key or ['pk'])
-    counter = 0
-    count = chunksize
-    while count == chunksize:
-        offset = counter - counter % chunksize
-        count = 0
-        for item in queryset.all().order_by(*key)[offset:offset + chunksize]:
-            count += 1
-            yield item
-        counter += count
-        gc.collect()
+def queryset_iterator(queryset, chunksize=10000, key='pk', server_side=False):
+    """
+    iterates over a large queryset in chunks of chunksize ordered by key, which
+    has to be unique. each chunk is fetched with a key range (key > last key)
+    instead of an OFFSET so later chunks are as cheap as the first. works with
+    values(), values_list() and only() since the key is never read off the rows.
+    server_side=True streams from a single named cursor instead (postgres only)
+    """
+    if server_side:
+        yield from queryset.order_by(key).iterator(chunk_size=chunksize)
+        return
+
+    queryset = queryset.order_by(key)
+    keys = queryset.values_list(key, flat=True)
+    last_key = None
+    while True:
+        if last_key is None:
+            chunk_qs, chunk_keys = queryset, keys
+        else:
+            chunk_qs = queryset.filter(**{key + '__gt': last_key})
+            chunk_keys = keys.filter(**{key + '__gt': last_key})
+        # the chunk's upper bound comes from an index-only lookup so the rows
+        # themselves can be fetched with a plain range query
+        upper = list(chunk_keys[chunksize - 1:chunksize])
+        if not upper:
+            yield from chunk_qs
+            return
+        last_key = upper[0]
+        yield from chunk_qs.filter(**{key + '__lte': last_key})
@@ -0,0 +1,35 @@
+from datetime import timedelta
+import random
+
+from django.conf import settings
+from django.utils import timezone
+
+
+def add_jitter(interval, jitter=None):
+    if jitter is None:
+        jitter = settings.FEED_CRAWL_JITTER
+    return interval * random.uniform(1 - jitter, 1 + jitter)
+
+
+def get_crawl_interval(num_articles, last_article_on, error_count=0, now=None):
+    """
+    num_articles is the number of articles seen in the last FEED_CRAWL_HISTORY_DAYS.
+    busy feeds are polled twice per expected article, feeds that haven't published
+    in FEED_CRAWL_DEAD_AFTER_DAYS are treated as dead and errors back off exponentially
+    """
+    now = now or timezone.now()
+    min_interval = timedelta(minutes=settings.FEED_CRAWL_MIN_INTERVAL)
+    max_interval = timedelta(minutes=settings.FEED_CRAWL_MAX_INTERVAL)
+    dead_interval = timedelta(minutes=settings.FEED_CRAWL_DEAD_INTERVAL)
+
+    if now - last_article_on > timedelta(days=settings.FEED_CRAWL_DEAD_AFTER_DAYS):
+        interval = dead_interval
+    elif num_articles:
+        interval = timedelta(days=settings.FEED_CRAWL_HISTORY_DAYS) / num_articles / 2
+        interval = min(max(interval, min_interval), max_interval)
+    else:
+        interval = max_interval
+
+    if error_count:
+        interval = min(interval * 2 ** min(error_count, 10), dead_interval)
+    return add_jitter(interval)
@@ -1,11 +1,23 @@
+from collections import defaultdict
+from contextlib import contextmanager
 import copy
 from datetime import datetime
+import fcntl
+import json
+import logging
+import os
+import time
+import uuid
 
 from elasticsearch_dsl import Search, Q
 from elasticsearch_dsl.connections import connections
 
 from django.conf import settings
 
+from mnemonic.news.utils.file_utils import mkdir_p
+
+_LOG = logging.getLogger(__name__)
+
 ES_CLIENT = None
 
 
@@ -16,9 +28,188 @@ def get_connection():
     return ES_CLIENT
 
 
-def get_client():
+def reset_connection():
+    """
+    for forked workers - the client inherited from the parent shares its
+    sockets, so the default connection is replaced with a fresh one
+    """
+    global ES_CLIENT
+    ES_CLIENT = None
+    get_connection()
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextmanager
+def _bulk_load_state(name):
+    """
+    the sessions sharing a bulk load and the settings to put back once the last
+    of them ends, kept in a file under a lock. sessions of processes that died
+    without ending them are dropped
+    """
+    mkdir_p(settings.INDEX_BULK_LOAD_STATE_DIR)
+    path = os.path.join(settings.INDEX_BULK_LOAD_STATE_DIR, name)
+    with open(path + '.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            state = {'sessions': [], 'originals': None}
+            if os.path.exists(path + '.json'):
+                with open(path + '.json') as f:
+                    state = json.load(f)
+            state['sessions'] = [session for session in state['sessions'] if _is_alive(session[0])]
+            yield state
+            with open(path + '.json', 'w') as f:
+                json.dump(state, f)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def bulk_load_mode(pattern=None, translog_async=False, force_merge=None):
+    """
+    turns off refreshes and replicas (and optionally per-request translog fsyncs)
+    for the indices matching pattern while loading into them. partitions created
+    during the load pick the same settings up from a temporary template.
+    overlapping loads into the same pattern share the mode - the first one turns
+    it on and the last one to finish puts the original settings back, even if
+    the load fails
+    """
+    from mnemonic.news.search_indices import News
+
+    es = get_connection()
+    pattern = pattern or News.get_index_prefix() + '-*'
+    bulk_settings = dict(settings.INDEX_BULK_LOAD_SETTINGS)
+    if translog_async:
+        bulk_settings['index.translog.durability'] = 'async'
+    template_name = '%s-bulk-load' % pattern.rstrip('-*')
+    session = [os.getpid(), uuid.uuid4().hex]
+
+    with _bulk_load_state(template_name) as state:
+        if not state['sessions']:
+            # left behind by a load that died - the indices still have the bulk settings
+            if state['originals'] is None:
+                current = es.indices.get_settings(index=pattern, name=list(bulk_settings), flat_settings=True)
+                state['originals'] = {index: {k: d['settings'].get(k) for k in bulk_settings}
+                                      for index, d in current.items()}
+            es.indices.put_template(name=template_name, body={'index_patterns': [pattern],
+                                                              'order': 100,
+                                                              'settings': bulk_settings})
+            if state['originals']:
+                es.indices.put_settings(index=pattern, body=bulk_settings)
+        state['sessions'].append(session)
+        num_sessions = len(state['sessions'])
+    num_docs = es.count(index=pattern)['count']
+    _LOG.info('bulk load mode on for [%s] - %s doc(s), %s session(s)', pattern, num_docs, num_sessions)
+
+    start = time.time()
+    try:
+        yield
+    finally:
+        load_time = time.time() - start
+        with _bulk_load_state(template_name) as state:
+            state['sessions'] = [s for s in state['sessions'] if s != session]
+            is_last = not state['sessions']
+            if is_last:
+                es.indices.delete_template(name=template_name, ignore=404)
+                # partitions created during the load go back to the defaults
+                originals = state['originals'] or {}
+                for index in es.indices.get_settings(index=pattern, name=list(bulk_settings), flat_settings=True):
+                    es.indices.put_settings(index=index, body=originals.get(index, {k: None for k in bulk_settings}))
+                state['originals'] = None
+
+        start = time.time()
+        es.indices.refresh(index=pattern)
+        refresh_time = time.time() - start
+        num_loaded = es.count(index=pattern)['count'] - num_docs
+        _LOG.info('bulk load mode %s for [%s] - loaded %s doc(s) in %.2fs (%.1f docs/s), refresh took %.2fs',
+                  'off' if is_last else 'left on for other sessions', pattern, num_loaded, load_time,
+                  num_loaded / load_time if load_time else 0, refresh_time)
+
+        if force_merge and not is_last:
+            _LOG.info('not force merging [%s] while other loads are running', pattern)
+        elif force_merge:
+            start = time.time()
+            es.indices.forcemerge(index=pattern, max_num_segments=force_merge, request_timeout=60 * 60)
+            _LOG.info('force merged [%s] to %s segment(s) in %.2fs', pattern, force_merge, time.time() - start)
+
+
+def delete_stale_copies(docs):
+    """
+    a document whose published_on moved to another partition is written there
+    as a new document and its old copy stays behind. docs is a list of
+    (index, id) pairs that were just created - copies of them in any other
+    partition of the same version are deleted
+    """
+    from mnemonic.news.search_indices import News
+
+    by_version = defaultdict(lambda: defaultdict(list))
+    for index, _id in docs:
+        by_version[News.get_index_version(index)][index].append(_id)
+    num_deleted = 0
+    for version, by_index in by_version.items():
+        query = {'bool': {'should': [{'bool': {'filter': [{'ids': {'values': ids}}],
+                                               'must_not': [{'term': {'_index': index}}]}}
+                                     for index, ids in by_index.items()],
+                          'minimum_should_match': 1}}
+        r = get_connection().delete_by_query(index=News.get_index_prefix(version) + '-*', body={'query': query},
+                                             conflicts='proceed', request_timeout=settings.INDEX_BULK_REQUEST_TIMEOUT)
+        num_deleted += r['deleted']
+    if num_deleted:
+        _LOG.info('deleted %s stale copies of re-dated documents', num_deleted)
+    return num_deleted
+
+
+def bulk_delete(docs):
+    """
+    deletes the (index, id) pairs in docs. documents that are already gone
+    count as deleted. returns the ids that hit transient errors
+    """
+    from elasticsearch.helpers import streaming_bulk
+
+    actions = ({'_op_type': 'delete', '_index': index, '_id': _id} for index, _id in docs)
+    failed = []
+    num_deleted = 0
+    for ok, item in streaming_bulk(get_connection(), actions,
+                                   chunk_size=settings.INDEX_BULK_CHUNK_SIZE,
+                                   raise_on_error=False,
+                                   raise_on_exception=False,
+                                   request_timeout=settings.INDEX_BULK_REQUEST_TIMEOUT):
+        op_type, info = item.popitem()
+        status = info.get('status')
+        if ok or status == 404:
+            num_deleted += 1
+        elif not isinstance(status, int) or status == 429 or status >= 500:
+            failed.append(info['_id'])
+        else:
+            _LOG.warning('error deleting doc:[%s] - %s', info['_id'], info.get('error'))
+    _LOG.info('deleted %s doc(s), %s failed', num_deleted, len(failed))
+    return failed
+
+
+def get_client(start_date=None, end_date=None):
+    """
+    searches only the partitions that overlap start_date - end_date
+    """
+    from mnemonic.news.search_indices import News
+
     client = get_connection()
-    return Search(using=client, index="news")
+    index = News.get_index_names(start_date, end_date)
+    return Search(using=client, index=index).params(ignore_unavailable=True)
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return
 
 
 def serialize_search_results(results):
@@ -38,7 +229,8 @@ def filter_values(s, field_name, values):
 
 def get_search_results(query=None, source_types=None, newspapers=None, twitter_handles=None,
                        twitter_mentions=None, start_date=None, end_date=None):
-    s = get_client()
+    s = get_client(start_date=parse_date(start_date[0]) if start_date and start_date[0] else None,
+                   end_date=parse_date(end_date[0]) if end_date and end_date[0] else None)
     if query and query[0]:
         s = s.filter("simple_query_string", query=query[0], fields=['title', 'body'])
     if source_types:
@@ -1,16 +1,23 @@
+from datetime import datetime
 import gzip
 import logging
+import os
 
+import pytz
 from retry import retry
 import twint
 from twint.tweet import tweet as Tweet
 from tqdm import tqdm
 
-from mnemonic.news.utils.msgpack_utils import streaming_loads2 as streaming_loads, dumps
+from django.conf import settings
+from django.core.validators import EMPTY_VALUES
+
+from mnemonic.news.utils.block_utils import BlockReader, BlockWriter, in_range
+from mnemonic.news.utils.iter_utils import chunkify
+from mnemonic.news.utils.msgpack_utils import streaming_loads2 as streaming_loads
 from mnemonic.news.utils.string_utils import slugify
 
 _LOG = logging.getLogger(__name__)
-GZIP_FILES = False
 
 
 def get_crawl_fname(prefix, signature_parts):
@@ -18,6 +25,36 @@ def get_crawl_fname(prefix, signature_parts):
     return prefix % s
 
 
+def get_legacy_dicts(fname, desc=None):
+    """
+    tweets from a results file written before the block format - one msgpack
+    list per flush, optionally gzipped as a whole
+    """
+    if not os.path.exists(fname):
+        return
+    if fname.endswith('.gz'):
+        data = streaming_loads(gzip.open(fname, 'rb'))
+    else:
+        data = streaming_loads(open(fname, 'rb'))
+    for d_set in tqdm(data, desc='reading tweets:%s' % (desc or fname)):
+        if isinstance(d_set, list) and d_set and isinstance(d_set[0], dict) and 'conversation_id' in d_set[0]:
+            yield from d_set
+
+
+def get_results_writer(fname):
+    return BlockWriter(fname, get_tweet_keys,
+                       codec=settings.CRAWL_RESULTS_CODEC, level=settings.CRAWL_RESULTS_COMPRESSION_LEVEL)
+
+
+def convert_legacy_results(legacy_fname, fname, block_size=25 * 1000):
+    writer = get_results_writer(fname)
+    try:
+        for chunk in chunkify(get_legacy_dicts(legacy_fname), block_size):
+            writer.write(list(chunk))
+    finally:
+        writer.close()
+
+
 class CrawlBuffer(object):
     def __init__(self, username, limit=None, since=None, until=None, mentions=False,
                  language=None, only_cached=False, buffer_size=25 * 1000):
@@ -51,49 +88,161 @@ class CrawlBuffer(object):
         self.resume_fname = c.Resume
 
         self.id = '_'.join(signature_parts)
-        if GZIP_FILES:
-            self.fname = get_crawl_fname('state/twint/results_%s.msgpack.gz', signature_parts)
-            self.file = gzip.open(self.fname, 'ab')
-        else:
-            self.fname = get_crawl_fname('state/twint/results_%s.msgpack', signature_parts)
-            self.file = open(self.fname, 'ab')
+        self.fname = get_crawl_fname('state/twint/results_%s.blocks', signature_parts)
+        # results crawled before the block format are still read
+        self.legacy_fnames = [get_crawl_fname('state/twint/results_%s.msgpack', signature_parts),
+                              get_crawl_fname('state/twint/results_%s.msgpack.gz', signature_parts)]
+        self.writer = None
+        self.max_tweet_id = None
+        self.max_timestamp = None
+        self.min_timestamp = None
         self.buffer = []
         self.buffer_size = buffer_size
         self.only_cached = only_cached
+        # twint returned without raising
+        self.is_finished = False
 
     def flush(self):
         _LOG.info('flushing buffer for [%s]', self.fname)
-        self.file.write(dumps(self.buffer))
+        if self.writer is None:
+            self.writer = get_results_writer(self.fname)
+        self.writer.write(self.buffer)
         self.buffer = []
 
     def append(self, tweet):
-        self.buffer.append(vars(tweet))
+        d = vars(tweet)
+        ts, tweet_id = get_tweet_keys(d)
+        if self.max_tweet_id is None or tweet_id > self.max_tweet_id:
+            self.max_tweet_id = tweet_id
+        if self.max_timestamp is None or ts > self.max_timestamp:
+            self.max_timestamp = ts
+        if self.min_timestamp is None or ts < self.min_timestamp:
+            self.min_timestamp = ts
+        self.buffer.append(d)
         if len(self.buffer) >= self.buffer_size:
             self.flush()
 
     def close(self):
         if self.buffer:
             self.flush()
-        self.file.flush()
-        self.file.close()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    @property
+    def max_datetime(self):
+        if self.max_timestamp is not None:
+            return datetime.fromtimestamp(self.max_timestamp / 1000, pytz.utc)
+
+    @property
+    def min_datetime(self):
+        if self.min_timestamp is not None:
+            return datetime.fromtimestamp(self.min_timestamp / 1000, pytz.utc)
 
     @retry(tries=1000)
     def start_crawl(self):
         if not self.only_cached:
             twint.run.Search(self.twint_config)
-
-    def get_data(self):
+            self.is_finished = True
+
+    def get_dicts(self, since=None, until=None, min_id=None, max_id=None):
+        """
+        the stored tweets as the dicts twint produced. cheaper than get_data()
+        when only a few fields are needed. only the blocks that overlap
+        [since, until) and [min_id, max_id] are read
+        """
         self.close()
-        if GZIP_FILES:
-            data = streaming_loads(gzip.open(self.fname, 'rb'))
-        else:
-            data = streaming_loads(open(self.fname, 'rb'))
-        for d_set in tqdm(data, desc='reading tweets:%s' % self.id):
-            if isinstance(d_set, list) and d_set and isinstance(d_set[0], dict) and 'conversation_id' in d_set[0]:
-                for d in d_set:
-                    t = Tweet()
-                    for k, v in d.items():
-                        if isinstance(v, str):
-                            v = v.replace('\u0000', '')
-                        t.__dict__[k] = v
-                    yield t
+        since = get_timestamp(since) if since else None
+        until = get_timestamp(until) if until else None
+        filtered = any(v is not None for v in (since, until, min_id, max_id))
+        for legacy_fname in self.legacy_fnames:
+            for d in get_legacy_dicts(legacy_fname, self.id):
+                if not filtered or in_range(*get_tweet_keys(d), since, until, min_id, max_id):
+                    yield d
+        reader = BlockReader(self.fname, get_tweet_keys)
+        yield from tqdm(reader.iter_records(since, until, min_id, max_id), desc='reading tweets:%s' % self.id)
+
+    def get_data(self, **kwargs):
+        for d in self.get_dicts(**kwargs):
+            t = Tweet()
+            for k, v in d.items():
+                if isinstance(v, str):
+                    v = v.replace('\u0000', '')
+                t.__dict__[k] = v
+            yield t
+
+
+def get_tweet_datetime(value):
+    if isinstance(value, int):
+        return datetime.fromtimestamp(value / 1000, pytz.utc)
+    else:
+        # '%Y-%m-%d %H:%M:%S %Z' - strptime is several times slower than this
+        return datetime.fromisoformat(value[:19])
+
+
+def get_timestamp(dt):
+    # naive datetimes are taken to be in utc, like the ones in stored tweets
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=pytz.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def get_tweet_keys(d):
+    """
+    (epoch millis, tweet id) of a stored tweet dict - what crawl result blocks are indexed by
+    """
+    value = d['datetime']
+    ts = value if isinstance(value, int) else get_timestamp(get_tweet_datetime(value))
+    return ts, int(d['id'])
+
+
+def _clean(value):
+    if isinstance(value, str):
+        return value.replace('\u0000', '')
+    return value
+
+
+def get_tweet_index_action(d):
+    """
+    maps a stored tweet dict straight to a bulk index action
+    """
+    from mnemonic.news.search_indices import News
+
+    published_on = get_tweet_datetime(d['datetime'])
+    mentions = (d.get('reply_to') or []) + (d.get('mentions') or [])
+    source = {
+        'source': _clean(d.get('username')),
+        'source_type': 'tweet',
+        'mentions': [_clean(m['screen_name']) for m in mentions if m.get('screen_name')],
+        'title': _clean(d.get('tweet')),
+        'published_on': published_on,
+        'url': d.get('link'),
+    }
+    return {
+        '_index': News.get_index_name(published_on),
+        '_id': 'tweet.%s' % d['id'],
+        '_source': {k: v for k, v in source.items() if v not in EMPTY_VALUES},
+    }
+
+
+def index_twitter_job(twitter_job_id):
+    from mnemonic.news.models import TwitterJob
+    TwitterJob.objects.get(pk=twitter_job_id).start_indexing()
+
+
+def update_seen_tweets_disk_cache(since=None):
+    """
+    ids of the tweets that are already in the index, optionally only those
+    published after since
+    """
+    from elasticsearch.helpers import scan
+    from mnemonic.news.search_indices import News
+    from mnemonic.news.utils.search_utils import get_connection
+
+    filters = [{'term': {'source_type': 'tweet'}}]
+    if since:
+        filters.append({'range': {'published_on': {'gte': since}}})
+    query = {'query': {'bool': {'filter': filters}}, '_source': False}
+    index = News.get_index_names(since.date() if since else None)
+    for hit in scan(get_connection(), index=index, query=query, size=5000, ignore_unavailable=True):
+        yield hit['_id'][len('tweet.'):]